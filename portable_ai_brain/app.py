@@ -1,7 +1,14 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from routers import prompt_router, multimodal_router, document_router, search_router
-from routers.pdf_router import router as pdf_router  # Fix the router import
+from routers.pdf_router import router as pdf_router, ingestion_jobs  # Fix the router import
+from routers.multimodal_router import vision_batcher, transcription_jobs
+from llm_clients.http_pool import close_http_clients
+from llm_clients.openai_client import reset_clients
+from document.vector_store import warm_vector_stores, vector_db_path
+from pdf.pdf_utils import shutdown_extract_pool
+from starlette.concurrency import run_in_threadpool
+import os
 
 app = FastAPI()
 
@@ -13,6 +20,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def warm_hot_indexes():
+    # VECTOR_STORE_WARMUP: comma-separated document ids or index paths to preload
+    targets = [t.strip() for t in os.getenv("VECTOR_STORE_WARMUP", "").split(",") if t.strip()]
+    db_paths = [t if os.path.isdir(t) else vector_db_path(t) for t in targets]
+    if db_paths:
+        await run_in_threadpool(warm_vector_stores, db_paths)
+
+@app.on_event("shutdown")
+async def shutdown_background_work():
+    # Stop ingestion, captioning, transcription and extraction workers, then release pooled keep-alive connections held by the LLM clients
+    await ingestion_jobs.shutdown()
+    await vision_batcher.shutdown()
+    await transcription_jobs.shutdown()
+    shutdown_extract_pool()
+    await close_http_clients()
+    reset_clients()
+
 @app.post("/prompt")
 async def handle_prompt(request: Request):
     data = await request.json()
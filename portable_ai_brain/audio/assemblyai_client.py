@@ -1,24 +1,60 @@
 # audio/assemblyai_client.py
-import requests
+import os
+from typing import AsyncIterator
+from llm_clients.http_pool import get_async_http_client
+from audio.transcription import TranscriptionManager
+
+# Point at audio/assemblyai_stub.py (e.g. http://localhost:8765/v2) to run without the real service
+ASSEMBLYAI_BASE_URL = os.getenv("ASSEMBLYAI_BASE_URL", "https://api.assemblyai.com/v2").rstrip("/")
+# Public URL of /multimodal/transcription-webhook; when unset, transcripts are polled
+TRANSCRIPTION_WEBHOOK_URL = os.getenv("TRANSCRIPTION_WEBHOOK_URL")
+TRANSCRIPTION_WEBHOOK_SECRET = os.getenv("TRANSCRIPTION_WEBHOOK_SECRET")
+WEBHOOK_AUTH_HEADER = "X-Webhook-Secret"
 
 class AssemblyAIClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: str = ASSEMBLYAI_BASE_URL):
         self.api_key = api_key
+        self.base_url = base_url
         self.headers = {
             "authorization": self.api_key,
             "content-type": "application/json"
         }
-    
-    def transcribe_audio_url(self, audio_url: str) -> str:
-        transcript_endpoint = "https://api.assemblyai.com/v2/transcript"
-        response = requests.post(transcript_endpoint, json={"audio_url": audio_url}, headers=self.headers)
-        transcript_id = response.json()["id"]
-        
-        polling_endpoint = f"{transcript_endpoint}/{transcript_id}"
-        while True:
-            polling_response = requests.get(polling_endpoint, headers=self.headers)
-            status = polling_response.json()["status"]
-            if status == "completed":
-                return polling_response.json()["text"]
-            elif status == "error":
-                raise Exception("Transcription failed.")
+        # Shared by every endpoint: backoff polling and webhook wake-ups per transcript
+        self.jobs = TranscriptionManager(self, use_webhook=bool(TRANSCRIPTION_WEBHOOK_URL))
+
+    async def upload(self, chunks: AsyncIterator[bytes]) -> str:
+        """Stream audio to the service and return its upload URL."""
+        client = get_async_http_client()
+        response = await client.post(f"{self.base_url}/upload", content=chunks, headers={"authorization": self.api_key})
+        response.raise_for_status()
+        return response.json()["upload_url"]
+
+    async def request_transcript(self, audio_url: str, **options) -> str:
+        """Start a transcription and return its id without waiting for it."""
+        payload = {"audio_url": audio_url, **options}
+        if TRANSCRIPTION_WEBHOOK_URL:
+            payload["webhook_url"] = TRANSCRIPTION_WEBHOOK_URL
+            if TRANSCRIPTION_WEBHOOK_SECRET:
+                payload["webhook_auth_header_name"] = WEBHOOK_AUTH_HEADER
+                payload["webhook_auth_header_value"] = TRANSCRIPTION_WEBHOOK_SECRET
+        client = get_async_http_client()
+        response = await client.post(f"{self.base_url}/transcript", json=payload, headers=self.headers)
+        response.raise_for_status()
+        return response.json()["id"]
+
+    async def get_transcript(self, transcript_id: str) -> dict:
+        client = get_async_http_client()
+        response = await client.get(f"{self.base_url}/transcript/{transcript_id}", headers=self.headers)
+        response.raise_for_status()
+        return response.json()
+
+    async def transcribe(self, chunks: AsyncIterator[bytes], **options) -> dict:
+        """Upload, transcribe and wait; returns the finished transcript."""
+        audio_url = await self.upload(chunks)
+        transcript_id = await self.request_transcript(audio_url, **options)
+        return await self.jobs.wait(transcript_id)
+
+    async def transcribe_audio_url(self, audio_url: str) -> str:
+        transcript_id = await self.request_transcript(audio_url)
+        transcript = await self.jobs.wait(transcript_id)
+        return transcript["text"]
@@ -0,0 +1,73 @@
+"""
+Local stand-in for the AssemblyAI v2 endpoints used by AssemblyAIClient.
+
+    uvicorn audio.assemblyai_stub:app --port 8765
+    ASSEMBLYAI_BASE_URL=http://localhost:8765/v2 uvicorn app:app
+
+Transcripts complete STUB_TRANSCRIPT_SECONDS after they are requested (and
+call the webhook, if one was given); audio URLs containing "fail" end in an
+error instead.
+"""
+import asyncio
+import os
+import time
+import uuid
+import httpx
+from fastapi import FastAPI, HTTPException, Request
+
+STUB_TRANSCRIPT_SECONDS = float(os.getenv("STUB_TRANSCRIPT_SECONDS", "3"))
+
+app = FastAPI()
+transcripts: dict[str, dict] = {}
+
+
+@app.post("/v2/upload")
+async def upload(request: Request):
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    upload_id = uuid.uuid4().hex
+    return {"upload_url": f"{request.base_url}v2/files/{upload_id}?bytes={size}"}
+
+
+async def _finish(transcript_id: str):
+    await asyncio.sleep(STUB_TRANSCRIPT_SECONDS)
+    transcript = transcripts[transcript_id]
+    if "fail" in transcript["audio_url"]:
+        transcript.update(status="error", error="Stub transcription failed.")
+    else:
+        transcript.update(status="completed", text=f"Stub transcript of {transcript['audio_url']}.", chapters=[])
+    if transcript.get("webhook_url"):
+        headers = {}
+        if transcript.get("webhook_auth_header_name"):
+            headers[transcript["webhook_auth_header_name"]] = transcript.get("webhook_auth_header_value", "")
+        async with httpx.AsyncClient() as client:
+            try:
+                await client.post(
+                    transcript["webhook_url"],
+                    json={"transcript_id": transcript_id, "status": transcript["status"]},
+                    headers=headers
+                )
+            except httpx.HTTPError as e:
+                print(f"Stub webhook delivery failed: {e}")
+
+
+@app.post("/v2/transcript")
+async def create_transcript(request: Request):
+    body = await request.json()
+    if "audio_url" not in body:
+        raise HTTPException(status_code=400, detail="audio_url is required")
+    transcript_id = uuid.uuid4().hex
+    transcripts[transcript_id] = {**body, "id": transcript_id, "status": "queued", "text": None, "created": time.time()}
+    asyncio.create_task(_finish(transcript_id))
+    return {"id": transcript_id, "status": "queued"}
+
+
+@app.get("/v2/transcript/{transcript_id}")
+async def get_transcript(transcript_id: str):
+    transcript = transcripts.get(transcript_id)
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    if transcript["status"] == "queued" and time.time() - transcript["created"] > STUB_TRANSCRIPT_SECONDS / 3:
+        transcript["status"] = "processing"
+    return {key: value for key, value in transcript.items() if key != "created"}
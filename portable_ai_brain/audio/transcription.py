@@ -0,0 +1,86 @@
+import asyncio
+import os
+import random
+
+TRANSCRIPTION_POLL_INITIAL = float(os.getenv("TRANSCRIPTION_POLL_INITIAL", "1"))
+TRANSCRIPTION_POLL_MAX = float(os.getenv("TRANSCRIPTION_POLL_MAX", "15"))
+TRANSCRIPTION_POLL_FACTOR = float(os.getenv("TRANSCRIPTION_POLL_FACTOR", "1.5"))
+# With webhooks, polling is only a safety net (e.g. the webhook reached another worker)
+TRANSCRIPTION_WEBHOOK_POLL = float(os.getenv("TRANSCRIPTION_WEBHOOK_POLL", "60"))
+TRANSCRIPTION_TIMEOUT = float(os.getenv("TRANSCRIPTION_TIMEOUT", "3600"))
+
+FINISHED_STATUSES = ("completed", "error")
+
+
+class TranscriptionFailed(Exception):
+    pass
+
+
+class TranscriptionManager:
+    """
+    Waits for transcripts without blocking the event loop: each wait polls
+    with exponential backoff, or sleeps until the webhook for its transcript
+    arrives. Any number of transcripts can be in flight per worker, and
+    concurrent waits on the same transcript share one poller.
+    """
+
+    def __init__(self, client, use_webhook: bool = False):
+        self.client = client
+        self.use_webhook = use_webhook
+        self._wakeups: dict[str, asyncio.Event] = {}
+        self._pollers: dict[str, asyncio.Task] = {}
+
+    def notify(self, transcript_id: str) -> bool:
+        """Webhook callback: wake the waiter for a transcript. False if nobody here is waiting."""
+        event = self._wakeups.get(transcript_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    async def _poll(self, transcript_id: str) -> dict:
+        delay = TRANSCRIPTION_POLL_INITIAL
+        loop = asyncio.get_running_loop()
+        # The poller outlives any one waiter, so it stops on its own deadline
+        deadline = loop.time() + TRANSCRIPTION_TIMEOUT
+        wakeup = self._wakeups.setdefault(transcript_id, asyncio.Event())
+        try:
+            while True:
+                transcript = await self.client.get_transcript(transcript_id)
+                if transcript["status"] in FINISHED_STATUSES:
+                    return transcript
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise TranscriptionFailed(
+                        f"Transcript {transcript_id} not finished after {TRANSCRIPTION_TIMEOUT:.0f}s."
+                    )
+                wakeup.clear()
+                # Jitter keeps many concurrent jobs from polling in lockstep
+                timeout = TRANSCRIPTION_WEBHOOK_POLL if self.use_webhook else delay * random.uniform(0.8, 1.2)
+                try:
+                    await asyncio.wait_for(wakeup.wait(), min(timeout, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * TRANSCRIPTION_POLL_FACTOR, TRANSCRIPTION_POLL_MAX)
+        finally:
+            self._wakeups.pop(transcript_id, None)
+
+    def _forget(self, transcript_id: str, poller: asyncio.Task) -> None:
+        # Runs however the poller ends, even if it is cancelled before it starts
+        if self._pollers.get(transcript_id) is poller:
+            del self._pollers[transcript_id]
+        if not poller.cancelled():
+            # Mark a failure as seen when every waiter has already given up
+            poller.exception()
+
+    async def wait(self, transcript_id: str, timeout: float = TRANSCRIPTION_TIMEOUT) -> dict:
+        """Wait for a transcript to finish and return it; raises TranscriptionFailed on error."""
+        poller = self._pollers.get(transcript_id)
+        if poller is None:
+            poller = self._pollers[transcript_id] = asyncio.ensure_future(self._poll(transcript_id))
+            poller.add_done_callback(lambda _: self._forget(transcript_id, poller))
+        # shield: one caller timing out or disconnecting must not stop the shared poller
+        transcript = await asyncio.wait_for(asyncio.shield(poller), timeout)
+        if transcript["status"] == "error":
+            raise TranscriptionFailed(transcript.get("error") or "Transcription failed.")
+        return transcript
@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import time
+from urllib.parse import parse_qs, urlparse
+from utils.sqlite_store import connect
+from utils.uploads import iter_file
+
+VIDEO_CACHE_DIR = os.getenv("VIDEO_CACHE_DIR", "video_cache")
+VIDEO_CACHE_PATH = os.getenv("VIDEO_CACHE_PATH", "video_cache.sqlite3")
+# Extracted audio kept on disk, oldest removed first beyond this size
+VIDEO_AUDIO_CACHE_MB = float(os.getenv("VIDEO_AUDIO_CACHE_MB", "2048"))
+YTDLP_MAX_CONCURRENCY = int(os.getenv("YTDLP_MAX_CONCURRENCY", "2"))
+
+# One yt-dlp run prints these after post-processing, one per line
+_PRINT_FIELDS = ("id", "title", "duration", "filepath")
+
+_download_slots = None
+# video id -> in-flight download / transcription, so concurrent requests for one video share them
+_downloads: dict[str, asyncio.Task] = {}
+_transcriptions: dict[str, asyncio.Task] = {}
+# in-flight task -> requests waiting on it; the last one to be cancelled stops the task
+_waiters: dict[asyncio.Task, int] = {}
+
+
+class VideoDownloadError(Exception):
+    pass
+
+
+def normalize_video_url(video_url: str) -> str:
+    """Expand youtu.be short links to the canonical watch URL."""
+    if "youtu.be" in video_url:
+        video_id = video_url.split("/")[-1].split("?")[0]
+        return f"https://www.youtube.com/watch?v={video_id}"
+    return video_url
+
+
+def video_id_from_url(video_url: str) -> str | None:
+    """YouTube video id, when it can be read from the URL without asking yt-dlp."""
+    parsed = urlparse(normalize_video_url(video_url))
+    if parsed.hostname and parsed.hostname.endswith("youtube.com"):
+        if parsed.path == "/watch":
+            return parse_qs(parsed.query).get("v", [None])[0]
+        if parsed.path.startswith(("/shorts/", "/embed/", "/live/")):
+            return parsed.path.split("/")[2] or None
+    return None
+
+
+_db_ready = False
+
+
+def _init_db():
+    global _db_ready
+    if _db_ready:
+        return
+    with connect(VIDEO_CACHE_PATH) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS video_transcripts ("
+            "video_id TEXT PRIMARY KEY, metadata TEXT NOT NULL, transcript TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+    _db_ready = True
+
+
+def cached_transcript(video_id: str):
+    """(transcript, metadata) for an already transcribed video, or None."""
+    _init_db()
+    with connect(VIDEO_CACHE_PATH) as conn:
+        row = conn.execute("SELECT transcript, metadata FROM video_transcripts WHERE video_id = ?", (video_id,)).fetchone()
+    return (row[0], json.loads(row[1])) if row else None
+
+
+def store_transcript(video_id: str, transcript: str, metadata: dict) -> None:
+    _init_db()
+    with connect(VIDEO_CACHE_PATH) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO video_transcripts (video_id, metadata, transcript, created_at) VALUES (?, ?, ?, ?)",
+            (video_id, json.dumps(metadata), transcript, time.time())
+        )
+
+
+def _cached_audio(video_id: str):
+    metadata_path = os.path.join(VIDEO_CACHE_DIR, f"{video_id}.json")
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, encoding="utf-8") as f:
+        metadata = json.load(f)
+    if not os.path.exists(metadata.get("filepath", "")):
+        return None
+    os.utime(metadata_path)  # least recently used goes first when pruning
+    return metadata
+
+
+def _prune_audio_cache(in_use: set) -> None:
+    """Remove least recently used audio beyond VIDEO_AUDIO_CACHE_MB, except for the video ids in_use."""
+    entries = []
+    for name in os.listdir(VIDEO_CACHE_DIR):
+        if name.endswith(".json") and name[:-len(".json")] not in in_use:
+            path = os.path.join(VIDEO_CACHE_DIR, name)
+            with open(path, encoding="utf-8") as f:
+                audio_path = json.load(f).get("filepath", "")
+            size = os.path.getsize(audio_path) if os.path.exists(audio_path) else 0
+            entries.append((os.path.getmtime(path), path, audio_path, size))
+    total = sum(entry[3] for entry in entries)
+    for _, path, audio_path, size in sorted(entries):
+        if total <= VIDEO_AUDIO_CACHE_MB * 1024 * 1024:
+            break
+        for stale in (audio_path, path):
+            if os.path.exists(stale):
+                os.remove(stale)
+        total -= size
+
+
+async def _run_ytdlp(video_url: str) -> dict:
+    global _download_slots
+    if _download_slots is None:
+        _download_slots = asyncio.Semaphore(max(1, YTDLP_MAX_CONCURRENCY))
+    os.makedirs(VIDEO_CACHE_DIR, exist_ok=True)
+    args = ["yt-dlp", "-x", "--audio-format", "mp3", "--no-simulate", "--no-playlist", "--no-progress"]
+    for field in _PRINT_FIELDS:
+        args += ["--print", f"after_move:{field}"]
+    args += ["-o", os.path.join(VIDEO_CACHE_DIR, "%(id)s.%(ext)s"), video_url]
+
+    async with _download_slots:
+        process = await asyncio.create_subprocess_exec(*args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+    if process.returncode != 0:
+        errors = stderr.decode(errors="replace").strip().splitlines()
+        raise VideoDownloadError(errors[-1] if errors else f"yt-dlp exited with {process.returncode}")
+
+    lines = stdout.decode(errors="replace").strip().splitlines()
+    if len(lines) < len(_PRINT_FIELDS):
+        raise VideoDownloadError(f"Unexpected yt-dlp output: {stdout!r}")
+    metadata = dict(zip(_PRINT_FIELDS, lines[-len(_PRINT_FIELDS):]))
+    with open(os.path.join(VIDEO_CACHE_DIR, f"{metadata['id']}.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    return metadata
+
+
+async def _shared(tasks: dict, key: str, start):
+    """
+    Result of the in-flight task for key, starting it with start() if there
+    is none. The task is cancelled once every caller waiting on it is.
+    """
+    task = tasks.get(key)
+    if task is None:
+        task = tasks[key] = asyncio.ensure_future(start())
+        task.add_done_callback(lambda _: tasks.pop(key, None))
+    _waiters[task] = _waiters.get(task, 0) + 1
+    try:
+        # shield: one caller going away must not stop a task others still wait for
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        if _waiters[task] == 1:
+            task.cancel()
+        raise
+    finally:
+        _waiters[task] -= 1
+        if not _waiters[task]:
+            del _waiters[task]
+
+
+async def download_audio(video_url: str) -> dict:
+    """
+    Metadata (id, title, duration) and the extracted mp3 ("filepath") of a
+    video, from one yt-dlp run. Audio is cached by video id; concurrent calls
+    for the same video share one download, which is killed once every one of
+    them has been cancelled.
+    """
+    video_url = normalize_video_url(video_url)
+    video_id = video_id_from_url(video_url)
+    if video_id:
+        metadata = await asyncio.to_thread(_cached_audio, video_id)
+        if metadata:
+            return metadata
+    return await _shared(_downloads, video_id or video_url, lambda: _run_ytdlp(video_url))
+
+
+async def _transcribe_audio(metadata: dict, audio_client) -> str:
+    try:
+        transcript = await audio_client.transcribe(iter_file(metadata["filepath"]), auto_chapters=True)
+        text = transcript["text"] or ""
+        if text.strip():
+            await asyncio.to_thread(store_transcript, metadata["id"], text, metadata)
+        return text
+    finally:
+        # Pruned only once the audio has been sent. This video is still in
+        # _transcriptions here, so it is kept along with every other video
+        # still downloading or being transcribed.
+        in_use = set(_downloads) | set(_transcriptions)
+        await asyncio.to_thread(_prune_audio_cache, in_use)
+
+
+async def video_transcript(video_url: str, audio_client, progress=None) -> tuple[str, dict]:
+    """
+    Transcript and metadata of a video. Videos transcribed before skip both
+    the download and the transcription, and concurrent calls for one video
+    share both. `progress(stage)` reports each step.
+    """
+    video_id = video_id_from_url(video_url)
+    if video_id:
+        cached = await asyncio.to_thread(cached_transcript, video_id)
+        if cached:
+            return cached
+
+    if progress:
+        progress("downloading")
+    metadata = await download_audio(video_url)
+    cached = await asyncio.to_thread(cached_transcript, metadata["id"])
+    if cached:
+        return cached
+
+    if progress:
+        progress("transcribing")
+    text = await _shared(_transcriptions, metadata["id"], lambda: _transcribe_audio(metadata, audio_client))
+    return text, metadata
@@ -0,0 +1,96 @@
+"""
+Recall vs. latency of the FAISS index types in document/ann_index.py.
+
+Run from portable_ai_brain/:
+
+    python -m benchmarks.vector_index --db vector_dbs/<id>.faiss
+    python -m benchmarks.vector_index --synthetic 200000
+
+--db reuses the vectors of an existing flat index; --synthetic generates
+clustered vectors of the embedding model's dimension. Recall@k is measured
+against exact (flat) search for queries drawn near corpus vectors.
+"""
+import argparse
+import os
+import time
+import faiss
+import numpy as np
+from document import ann_index
+from document.mapped_store import store_dir
+
+NPROBE_SWEEP = [1, 4, 16, 64]
+EF_SEARCH_SWEEP = [16, 64, 256]
+
+
+def load_vectors(db_path: str):
+    index = faiss.read_index(os.path.join(store_dir(db_path), "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 256):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.3 * rng.normal(size=(n, dim)).astype("float32")
+
+
+def make_queries(vectors, count: int):
+    rng = np.random.default_rng(1)
+    picked = vectors[rng.choice(len(vectors), count, replace=False)]
+    return picked + 0.05 * rng.normal(size=picked.shape).astype("float32")
+
+
+def measure(index, queries, truth, k: int):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0]) & set(expected))
+    return hits / (len(queries) * k), 1000 * float(np.median(latencies)), 1000 * float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="existing vector store directory (flat index)")
+    parser.add_argument("--synthetic", type=int, default=100000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--types", default=",".join(ann_index.INDEX_TYPES))
+    args = parser.parse_args()
+
+    vectors = load_vectors(args.db) if args.db else synthetic_vectors(args.synthetic, args.dim)
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = make_queries(vectors, min(args.queries, len(vectors)))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    # Benchmark the requested type even on small corpora
+    ann_index.ANN_MIN_VECTORS = 0
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<22}{'param':<14}{'recall':>8}{'p50 ms':>10}{'p95 ms':>10}{'size MB':>10}{'build s':>10}")
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = ann_index.make_index(vectors, index_type)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / (1024 * 1024)
+        description = ann_index.index_factory_string(vectors.shape[1], len(vectors), index_type)
+
+        if faiss.try_extract_index_ivf(index) is not None:
+            sweep = [(f"nprobe={n}", {"nprobe": n}) for n in NPROBE_SWEEP]
+        elif hasattr(index, "hnsw"):
+            sweep = [(f"efSearch={ef}", {"ef_search": ef}) for ef in EF_SEARCH_SWEEP]
+        else:
+            sweep = [("-", {})]
+        for label, params in sweep:
+            ann_index.apply_search_params(index, **params)
+            recall, p50, p95 = measure(index, queries, truth, args.k)
+            print(f"{description:<22}{label:<14}{recall:>8.3f}{p50:>10.3f}{p95:>10.3f}{size_mb:>10.1f}{build_seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Latency and caption agreement of the vision backends in vision/backends.py.
+
+Run from portable_ai_brain/:
+
+    python -m benchmarks.vision_inference --images path/to/images --threads 4
+    python -m benchmarks.vision_inference --images a.png b.jpg --references refs.json
+
+Every backend captions the same images one at a time (p50/p95 latency) and
+as one batch (images per second). Captions are compared with the "torch"
+baseline, and with reference captions ({"file name": "caption"}) if given,
+using word-overlap F1.
+"""
+import argparse
+import json
+import os
+import time
+from PIL import Image
+from vision.backends import BACKENDS
+from vision.vision_client import VisionClient
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp")
+
+
+def image_paths(inputs: list) -> list:
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += sorted(os.path.join(item, name) for name in os.listdir(item) if name.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.append(item)
+    return paths
+
+
+def word_f1(candidate: str, reference: str) -> float:
+    candidate_words, reference_words = candidate.lower().split(), reference.lower().split()
+    common = sum(min(candidate_words.count(word), reference_words.count(word)) for word in set(candidate_words))
+    if not common:
+        return 0.0
+    precision, recall = common / len(candidate_words), common / len(reference_words)
+    return 2 * precision * recall / (precision + recall)
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="+", required=True, help="image files or directories")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = library default)")
+    parser.add_argument("--references", help="JSON file mapping image file names to reference captions")
+    args = parser.parse_args()
+
+    paths = image_paths(args.images)
+    images = [Image.open(path).convert("RGB") for path in paths]
+    references = {}
+    if args.references:
+        with open(args.references, encoding="utf-8") as f:
+            references = json.load(f)
+
+    baseline = None
+    print(f"{len(images)} images, threads={args.threads or 'default'}")
+    print(f"{'backend':<10}{'load s':>8}{'p50 ms':>10}{'p95 ms':>10}{'batch img/s':>13}{'vs torch':>10}{'vs refs':>9}")
+    for backend in args.backends.split(","):
+        client = VisionClient(backend=backend, num_threads=args.threads)
+        start = time.perf_counter()
+        client.caption_images(images[:1])  # load (and export) outside the timings
+        load_seconds = time.perf_counter() - start
+
+        captions, latencies = [], []
+        for image in images:
+            start = time.perf_counter()
+            captions.append(client.caption_images([image])[0])
+            latencies.append(1000 * (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        client.caption_images(images)
+        throughput = len(images) / (time.perf_counter() - start)
+
+        if baseline is None and backend == "torch":
+            baseline = captions
+        agreement = sum(map(word_f1, captions, baseline)) / len(captions) if baseline else float("nan")
+        scored = [(caption, references[os.path.basename(path)]) for caption, path in zip(captions, paths) if os.path.basename(path) in references]
+        reference_f1 = sum(word_f1(caption, reference) for caption, reference in scored) / len(scored) if scored else float("nan")
+        print(f"{backend:<10}{load_seconds:>8.1f}{percentile(latencies, 0.5):>10.1f}{percentile(latencies, 0.95):>10.1f}"
+              f"{throughput:>13.2f}{agreement:>10.3f}{reference_f1:>9.3f}")
+        for path, caption in zip(paths, captions):
+            print(f"    {os.path.basename(path)}: {caption}")
+
+
+if __name__ == "__main__":
+    main()
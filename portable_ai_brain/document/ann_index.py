@@ -0,0 +1,86 @@
+import math
+import os
+import faiss
+import numpy as np
+
+# "flat" (exact), "hnsw", "ivf_flat" or "ivf_pq"
+VECTOR_INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")
+# Below this many vectors a flat index is both exact and fast enough, so it is always used
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "10000"))
+# Vectors sampled to train IVF centroids / PQ codebooks
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "50000"))
+
+HNSW_M = int(os.getenv("HNSW_M", "32"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+# 0 picks 4 * sqrt(n) lists
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("PQ_M", "48"))
+PQ_NBITS = int(os.getenv("PQ_NBITS", "8"))
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+
+def _nlist(n_vectors: int) -> int:
+    nlist = IVF_NLIST or int(4 * math.sqrt(n_vectors))
+    # k-means wants ~39 training points per centroid
+    return max(1, min(nlist, n_vectors // 39))
+
+
+def _pq_m(dim: int) -> int:
+    """Largest sub-quantizer count <= PQ_M that divides the dimension."""
+    m = min(PQ_M, dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def index_factory_string(dim: int, n_vectors: int, index_type: str = None) -> str:
+    index_type = index_type or VECTOR_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown VECTOR_INDEX_TYPE {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    if index_type == "flat" or n_vectors < ANN_MIN_VECTORS:
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M},Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{_nlist(n_vectors)},Flat"
+    return f"IVF{_nlist(n_vectors)},PQ{_pq_m(dim)}x{PQ_NBITS}"
+
+
+def needs_training(n_vectors: int, index_type: str = None) -> bool:
+    """Whether the index for n_vectors (IVF/PQ) must be trained before vectors are added."""
+    index_type = index_type or VECTOR_INDEX_TYPE
+    return index_type in ("ivf_flat", "ivf_pq") and n_vectors >= ANN_MIN_VECTORS
+
+
+def apply_search_params(index, nprobe: int = None, ef_search: int = None) -> None:
+    """Set query-time knobs (IVF nprobe, HNSW efSearch) on a built or loaded index."""
+    params = faiss.ParameterSpace()
+    if faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", nprobe or IVF_NPROBE)
+    if hasattr(index, "hnsw"):
+        params.set_index_parameter(index, "efSearch", ef_search or HNSW_EF_SEARCH)
+
+
+def make_index(vectors, index_type: str = None, n_vectors: int = None):
+    """
+    Create an empty FAISS index of the configured type, sized for the given
+    vectors (or for n_vectors in total, when only a first batch is at hand).
+    Trainable indexes are trained on a random sample of at most
+    ANN_TRAIN_SAMPLE of them; the caller adds the vectors afterwards.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    dim = vectors.shape[1]
+    index = faiss.index_factory(dim, index_factory_string(dim, n_vectors or len(vectors), index_type))
+    if hasattr(index, "hnsw"):
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        if len(vectors) > ANN_TRAIN_SAMPLE:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), ANN_TRAIN_SAMPLE, replace=False)]
+        else:
+            sample = vectors
+        index.train(sample)
+    apply_search_params(index)
+    return index
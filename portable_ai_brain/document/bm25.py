@@ -0,0 +1,111 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+BM25_FILENAME = "bm25.json"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "of", "on", "or", "tell", "that", "the", "this", "to", "was",
+    "what", "when", "where", "which", "who", "why", "with", "you", "about", "explain", "define"
+}
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Local inverted index with Okapi BM25 scoring over a document's chunks.
+    Saved as JSON next to the FAISS index so lexical search needs neither
+    the embeddings API nor the FAISS docstore.
+    """
+
+    def __init__(self, texts: list, metadatas: list, postings: dict, doc_lengths: list, k1: float = 1.5, b: float = 0.75):
+        self.texts = texts
+        self.metadatas = metadatas
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avgdl = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        self._doc_positions = None
+
+    @classmethod
+    def build(cls, texts: list, metadatas: list = None) -> "BM25Index":
+        postings: dict[str, list] = {}
+        doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                postings.setdefault(term, []).append([doc_id, freq])
+        return cls(list(texts), list(metadatas) if metadatas else [{} for _ in texts], postings, doc_lengths)
+
+    def save(self, directory: str, include_chunks: bool = True) -> None:
+        """Without include_chunks, texts and metadatas come from the store's chunk file on load."""
+        os.makedirs(directory, exist_ok=True)
+        data = {
+            "k1": self.k1,
+            "b": self.b,
+            "postings": self.postings,
+            "doc_lengths": self.doc_lengths
+        }
+        if include_chunks:
+            data["texts"] = self.texts
+            data["metadatas"] = self.metadatas
+        with open(os.path.join(directory, BM25_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, directory: str, chunks=None) -> "BM25Index":
+        """`chunks` supplies texts/metadatas (e.g. a ChunkStore) when they were not saved inline."""
+        with open(os.path.join(directory, BM25_FILENAME), encoding="utf-8") as f:
+            data = json.load(f)
+        if "texts" in data:
+            texts, metadatas = data["texts"], data["metadatas"]
+        else:
+            texts, metadatas = chunks.texts, chunks.metadatas
+        return cls(texts, metadatas, data["postings"], data["doc_lengths"], data["k1"], data["b"])
+
+    def _doc_index(self) -> dict:
+        """doc_id metadata value -> chunk positions, built once on first use (collections)."""
+        if self._doc_positions is None:
+            doc_positions: dict[str, list] = {}
+            for position, metadata in enumerate(self.metadatas):
+                doc_positions.setdefault(metadata.get("doc_id"), []).append(position)
+            self._doc_positions = doc_positions
+        return self._doc_positions
+
+    def positions_for(self, doc_ids: list) -> set:
+        """Chunk positions belonging to the given documents."""
+        doc_index = self._doc_index()
+        return {position for doc_id in doc_ids for position in doc_index.get(doc_id, [])}
+
+    def doc_counts(self) -> dict:
+        """Number of chunks per document."""
+        return {doc_id: len(positions) for doc_id, positions in self._doc_index().items() if doc_id is not None}
+
+    def covers(self, query: str) -> bool:
+        """True when every query term occurs somewhere in the index."""
+        terms = tokenize(query)
+        return bool(terms) and all(term in self.postings for term in terms)
+
+    def search(self, query: str, k: int = 5, allowed: set = None) -> list[tuple[int, float]]:
+        """Top-k (chunk position, score) pairs, best first, optionally only among `allowed` positions."""
+        scores: dict[int, float] = {}
+        n = len(self.doc_lengths)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, freq in postings:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / (self.avgdl or 1))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
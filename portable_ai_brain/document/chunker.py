@@ -0,0 +1,150 @@
+import os
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to a length estimate
+    _encoding = None
+
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "350"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+(?=["\'(\[]?[A-Z0-9])')
+NUMBERED_HEADING = re.compile(r'^(\d+(\.\d+)*\.?|[IVXLC]+\.|Chapter|Section|Part|Appendix)\s+\S', re.IGNORECASE)
+
+
+def count_tokens(text: str) -> int:
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+
+# Words left lowercase in title case; a title-case line ending in one reads as cut-off prose
+MINOR_WORDS = frozenset(
+    "a an and as at but by for from in into is of on or over per than that the to via vs with".split()
+)
+
+
+def _heading_strength(line: str) -> str | None:
+    """"strong" for numbered or all-caps headings, "title" for title case, else None."""
+    if not 2 <= len(line) <= 80 or line[-1] in ".,;:!?":
+        return None
+    words = line.split()
+    if len(words) > 12:
+        return None
+    if NUMBERED_HEADING.match(line):
+        return "strong"
+    letters = [c for c in line if c.isalpha()]
+    if letters and all(c.isupper() for c in letters):
+        return "strong"
+    significant = [word for word in words if word.lower() not in MINOR_WORDS]
+    if len(words) > 8 or not significant or not words[0][0].isupper() or words[-1].lower() in MINOR_WORDS:
+        return None
+    capitalized = sum(1 for word in significant if word[0].isupper())
+    return "title" if capitalized / len(significant) >= 0.9 else None
+
+
+def _blocks(page_text: str):
+    """Yield ("heading" | "paragraph", text) blocks of one page."""
+    lines = [" ".join(raw_line.split()) for raw_line in page_text.splitlines()]
+    paragraph = []
+    for i, line in enumerate(lines):
+        if not line:
+            if paragraph:
+                yield "paragraph", " ".join(paragraph)
+                paragraph = []
+            continue
+        strength = _heading_strength(line)
+        if strength:
+            next_line = lines[i + 1] if i + 1 < len(lines) else ""
+            # A line followed by a lowercase continuation is wrapped prose
+            continued = next_line[:1].islower()
+            if strength == "strong":
+                # Numbered and all-caps headings only count after a finished paragraph
+                is_heading = not paragraph or paragraph[-1][-1] in ".!?:"
+            else:
+                # Title case is common in prose, so it also needs a blank line (or page start) before it
+                is_heading = not paragraph and (i == 0 or not lines[i - 1] or _heading_strength(lines[i - 1]) is not None)
+            if is_heading and not continued:
+                if paragraph:
+                    yield "paragraph", " ".join(paragraph)
+                    paragraph = []
+                yield "heading", line
+                continue
+        paragraph.append(line)
+    if paragraph:
+        yield "paragraph", " ".join(paragraph)
+
+
+def _split_long(sentence: str, max_tokens: int):
+    """Cut a sentence longer than max_tokens on word boundaries."""
+    piece = []
+    for word in sentence.split():
+        if piece and count_tokens(" ".join(piece + [word])) > max_tokens:
+            yield " ".join(piece)
+            piece = []
+        piece.append(word)
+    if piece:
+        yield " ".join(piece)
+
+
+def chunk_pages(pages: list, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> tuple[list, list]:
+    """
+    Split page texts into chunks of at most max_tokens that follow the
+    document's structure: a heading always starts a new chunk, and chunks
+    are cut between sentences, never inside words. Consecutive chunks in a
+    section share up to overlap_tokens of trailing sentences.
+
+    Returns (chunks, metadatas); metadata holds the first and last page
+    (1-based) and the section heading of each chunk.
+    """
+    chunks, metadatas = [], []
+    # Sentences of the chunk being built: (text, page)
+    current = []
+    heading = None
+
+    def joined(units, extra: str = None) -> str:
+        texts = [text for text, _ in units]
+        if extra is not None:
+            texts.append(extra)
+        return " ".join(texts)
+
+    def flush(keep_overlap: bool):
+        nonlocal current
+        if not current or (len(current) == 1 and current[0][0] == heading):
+            # Nothing, or a heading with no body (e.g. followed by a sub-heading)
+            current = []
+            return
+        chunks.append(joined(current))
+        metadatas.append({"page": current[0][1], "page_end": current[-1][1], "heading": heading})
+        carried = []
+        if keep_overlap:
+            for unit in reversed(current):
+                if count_tokens(joined([unit] + carried)) > overlap_tokens:
+                    break
+                carried.insert(0, unit)
+            # Overlap alone must never make up a chunk
+            if len(carried) == len(current):
+                carried = []
+        current = carried
+
+    for page_num, page_text in enumerate(pages, start=1):
+        for kind, text in _blocks(page_text):
+            if kind == "heading":
+                flush(keep_overlap=False)
+                heading = text
+                current = [(text, page_num)]
+                continue
+            for sentence in SENTENCE_END.split(text):
+                pieces = [sentence] if count_tokens(sentence) <= max_tokens else list(_split_long(sentence, max_tokens))
+                for piece in pieces:
+                    # Count the joined text: per-sentence estimates undercount and miss the separators
+                    if current and count_tokens(joined(current, piece)) > max_tokens:
+                        flush(keep_overlap=True)
+                        if current and count_tokens(joined(current, piece)) > max_tokens:
+                            current = []
+                    current.append((piece, page_num))
+    flush(keep_overlap=False)
+    return chunks, metadatas
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import re
+import threading
+from contextlib import contextmanager
+import faiss
+import numpy as np
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within one process
+    fcntl = None
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from document.ann_index import ANN_MIN_VECTORS, VECTOR_INDEX_TYPE, make_index
+from document.mapped_store import MappedVectorStore, store_dir
+from document.vector_store import (
+    VECTOR_DB_DIR, embed_chunks, embedding_model, has_vector_store, load_bm25, load_vector_store, save_vector_store,
+    vector_db_path
+)
+
+COLLECTIONS_DIR = os.path.join(VECTOR_DB_DIR, "collections")
+COLLECTION_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# One writer per collection, across threads (these locks) and worker processes
+# (an flock on the collection's lockfile); readers use the cached copy until the files change
+_write_locks: dict[str, threading.Lock] = {}
+_write_locks_guard = threading.Lock()
+
+
+def collection_path(name: str) -> str:
+    if not COLLECTION_NAME.match(name):
+        raise ValueError("Collection names may only contain letters, digits, '-' and '_'")
+    return os.path.join(COLLECTIONS_DIR, name)
+
+
+def collection_exists(name: str) -> bool:
+    return has_vector_store(collection_path(name))
+
+
+@contextmanager
+def _write_lock(name: str):
+    with _write_locks_guard:
+        lock = _write_locks.setdefault(name, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(COLLECTIONS_DIR, exist_ok=True)
+        with open(f"{collection_path(name)}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _document_chunks(doc_id: str) -> tuple[list, list]:
+    """Texts and metadatas of a document's own vector store, in index order."""
+    db = load_vector_store(vector_db_path(doc_id))
+    if isinstance(db, MappedVectorStore):
+        docs = [db.chunks.document(i) for i in range(len(db.chunks))]
+    else:
+        docs = [db.docstore.search(db.index_to_docstore_id[i]) for i in range(db.index.ntotal)]
+    return [doc.page_content for doc in docs], [dict(doc.metadata) for doc in docs]
+
+
+def _open_for_write(db_path: str):
+    """A private copy of the collection, so cached readers never see a half-applied change."""
+    if has_vector_store(db_path):
+        return FAISS.load_local(store_dir(db_path), embedding_model, allow_dangerous_deserialization=True)
+    return None
+
+
+def _positions_of(db, doc_id: str) -> list:
+    return [
+        position for position, docstore_id in db.index_to_docstore_id.items()
+        if db.docstore.search(docstore_id).metadata.get("doc_id") == doc_id
+    ]
+
+
+def _remove_positions(db, positions: list) -> None:
+    ids = [db.index_to_docstore_id[position] for position in positions]
+    if type(db.index) is faiss.IndexFlatL2:
+        # Flat indexes remove in place and renumber the rest, as LangChain expects
+        db.delete(ids)
+        return
+    # HNSW cannot remove vectors and IVF keeps the old ids, so rebuild the
+    # ANN structure from the remaining chunks' (cached) embeddings
+    removed = set(positions)
+    keep = [position for position in range(db.index.ntotal) if position not in removed]
+    texts = [db.docstore.search(db.index_to_docstore_id[position]).page_content for position in keep]
+    db.docstore.delete(ids)
+    db.index_to_docstore_id = {new: db.index_to_docstore_id[old] for new, old in enumerate(keep)}
+    if texts:
+        vectors = np.array(embedding_model.embed_documents(texts), dtype="float32")
+        db.index = make_index(vectors)
+        db.index.add(vectors)
+    else:
+        db.index = faiss.IndexFlatL2(db.index.d)
+
+
+def _grow_index(db) -> None:
+    """Swap a collection's flat index for the configured ANN type once it is large enough."""
+    if VECTOR_INDEX_TYPE == "flat" or type(db.index) is not faiss.IndexFlatL2 or db.index.ntotal < ANN_MIN_VECTORS:
+        return
+    vectors = db.index.reconstruct_n(0, db.index.ntotal)
+    index = make_index(vectors)
+    index.add(vectors)
+    db.index = index
+
+
+async def add_to_collection(name: str, doc_id: str, progress=None) -> int:
+    """
+    Add an indexed document to a collection, replacing any earlier copy of it.
+    Only the document's chunks are embedded (mostly embedding-cache hits);
+    the rest of the collection is left as it is. Returns the chunk count.
+    """
+    db_path = collection_path(name)
+    texts, metadatas = await asyncio.to_thread(_document_chunks, doc_id)
+    if not texts:
+        return 0
+    metadatas = [{**metadata, "doc_id": doc_id} for metadata in metadatas]
+    vectors = await embed_chunks(texts, progress)
+
+    def write():
+        with _write_lock(name):
+            db = _open_for_write(db_path)
+            if db is None:
+                db = FAISS(
+                    embedding_function=embedding_model,
+                    index=make_index(vectors),
+                    docstore=InMemoryDocstore(),
+                    index_to_docstore_id={}
+                )
+            else:
+                positions = _positions_of(db, doc_id)
+                if positions:
+                    _remove_positions(db, positions)
+            db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas)
+            _grow_index(db)
+            save_vector_store(db, db_path)
+
+    await asyncio.to_thread(write)
+    return len(texts)
+
+
+def remove_from_collection(name: str, doc_id: str) -> int:
+    """Delete a document's chunks from a collection. Returns how many were removed."""
+    db_path = collection_path(name)
+    with _write_lock(name):
+        db = _open_for_write(db_path)
+        if db is None:
+            return 0
+        positions = _positions_of(db, doc_id)
+        if positions:
+            _remove_positions(db, positions)
+            save_vector_store(db, db_path)
+        return len(positions)
+
+
+def collection_documents(name: str) -> dict:
+    """Chunk count per document id in a collection."""
+    bm25 = load_bm25(collection_path(name))
+    return bm25.doc_counts() if bm25 else {}
+
+
+def list_collections() -> list:
+    if not os.path.isdir(COLLECTIONS_DIR):
+        return []
+    return sorted(name for name in os.listdir(COLLECTIONS_DIR) if COLLECTION_NAME.match(name) and collection_exists(name))
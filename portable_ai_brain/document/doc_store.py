@@ -0,0 +1,169 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from utils.sqlite_store import connect
+
+DOC_STORE_PATH = os.getenv("DOC_STORE_PATH", "doc_store.sqlite3")
+DOC_STORE_MEMORY_MB = float(os.getenv("DOC_STORE_MEMORY_MB", "256"))
+
+
+class DocumentStore:
+    """
+    Extracted PDF pages keyed by pdf_id.
+
+    SQLite on disk is the source of truth, so documents survive restarts and
+    are visible to every worker. Recently used documents are also kept in an
+    in-process LRU bounded by size in bytes.
+    """
+
+    def __init__(self, db_path: str = DOC_STORE_PATH, max_memory_bytes: int = int(DOC_STORE_MEMORY_MB * 1024 * 1024)):
+        self.db_path = db_path
+        self.max_memory_bytes = max_memory_bytes
+        self._memory: OrderedDict[str, tuple[list[str], int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                "pdf_id TEXT PRIMARY KEY, pages TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            # One row per distinct file content, shared by /pdf/upload and /document/upload-pdf
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "file_hash TEXT PRIMARY KEY, pdf_id TEXT NOT NULL, file_path TEXT NOT NULL, points TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_pdf_id ON uploads (pdf_id)")
+            # pdf_id -> path for files not in uploads, e.g. legacy copies whose content
+            # hash already belongs to another pdf_id
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_files (pdf_id TEXT PRIMARY KEY, file_path TEXT NOT NULL)"
+            )
+
+    def _remember(self, pdf_id: str, pages: list[str]) -> None:
+        size = sum(len(page.encode("utf-8")) for page in pages)
+        with self._lock:
+            if pdf_id in self._memory:
+                self._memory_bytes -= self._memory.pop(pdf_id)[1]
+            if size > self.max_memory_bytes:
+                # Larger than the whole memory tier: serve it from disk only
+                return
+            self._memory[pdf_id] = (pages, size)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, (_, evicted_size) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def put(self, pdf_id: str, pages: list[str]) -> None:
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (pdf_id, pages, created_at) VALUES (?, ?, ?)",
+                (pdf_id, json.dumps(pages), time.time())
+            )
+        self._remember(pdf_id, pages)
+
+    def get(self, pdf_id: str) -> list[str] | None:
+        with self._lock:
+            entry = self._memory.get(pdf_id)
+            if entry is not None:
+                self._memory.move_to_end(pdf_id)
+                return entry[0]
+
+        with connect(self.db_path) as conn:
+            row = conn.execute("SELECT pages FROM documents WHERE pdf_id = ?", (pdf_id,)).fetchone()
+        if row is None:
+            return None
+        pages = json.loads(row[0])
+        self._remember(pdf_id, pages)
+        return pages
+
+    def __contains__(self, pdf_id: str) -> bool:
+        with self._lock:
+            if pdf_id in self._memory:
+                return True
+        with connect(self.db_path) as conn:
+            row = conn.execute("SELECT 1 FROM documents WHERE pdf_id = ?", (pdf_id,)).fetchone()
+        return row is not None
+
+    def latest_id(self) -> str | None:
+        """The most recently stored pdf_id, across all workers."""
+        with connect(self.db_path) as conn:
+            row = conn.execute("SELECT pdf_id FROM documents ORDER BY created_at DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def find_upload(self, file_hash: str) -> dict | None:
+        """The earlier upload with this content hash, if any."""
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT pdf_id, file_path, points FROM uploads WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "pdf_id": row[0],
+            "file_path": row[1],
+            "points": json.loads(row[2]) if row[2] is not None else None
+        }
+
+    def find_file(self, pdf_id: str) -> str | None:
+        """Path of the stored PDF for a pdf_id (indexed lookup)."""
+        with connect(self.db_path) as conn:
+            row = conn.execute("SELECT file_path FROM uploads WHERE pdf_id = ?", (pdf_id,)).fetchone()
+            if row is None:
+                row = conn.execute("SELECT file_path FROM pdf_files WHERE pdf_id = ?", (pdf_id,)).fetchone()
+        return row[0] if row else None
+
+    def record_file(self, pdf_id: str, file_path: str) -> bool:
+        """Remember the path of a pdf_id's file; False if it was already recorded."""
+        with connect(self.db_path) as conn:
+            cursor = conn.execute(
+                "INSERT INTO pdf_files (pdf_id, file_path) VALUES (?, ?) "
+                "ON CONFLICT (pdf_id) DO UPDATE SET file_path = excluded.file_path "
+                "WHERE file_path != excluded.file_path",
+                (pdf_id, file_path)
+            )
+            return cursor.rowcount > 0
+
+    def record_upload(self, file_hash: str, pdf_id: str, file_path: str) -> None:
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (file_hash, pdf_id, file_path, points) VALUES (?, ?, ?, NULL)",
+                (file_hash, pdf_id, file_path)
+            )
+
+    def claim_upload(self, file_hash: str, pdf_id: str, file_path: str) -> dict:
+        """
+        Register an upload unless the same content is already stored. Returns
+        the winning record with "duplicate" set; atomic across workers, so
+        concurrent uploads of one file agree on a single pdf_id.
+        """
+        with connect(self.db_path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT pdf_id, file_path, points FROM uploads WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+            if row and row[1] != file_path and os.path.exists(row[1]):
+                return {
+                    "pdf_id": row[0],
+                    "file_path": row[1],
+                    "points": json.loads(row[2]) if row[2] is not None else None,
+                    "duplicate": True
+                }
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (file_hash, pdf_id, file_path, points) VALUES (?, ?, ?, NULL)",
+                (file_hash, pdf_id, file_path)
+            )
+        return {"pdf_id": pdf_id, "file_path": file_path, "points": None, "duplicate": False}
+
+    def set_summary_points(self, pdf_id: str, points: list[str]) -> None:
+        with connect(self.db_path) as conn:
+            conn.execute("UPDATE uploads SET points = ? WHERE pdf_id = ?", (json.dumps(points), pdf_id))
+
+    def count(self) -> int:
+        with connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+
+# Shared instance used by the routers
+document_store = DocumentStore()
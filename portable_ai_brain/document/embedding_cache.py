@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import json
+import os
+from langchain_core.embeddings import Embeddings
+from utils.sqlite_store import connect
+from document.query_cache import query_embedding_cache
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3")
+
+
+def chunk_key(model: str, text: str) -> str:
+    """Content address of an embedding: sha256 over (model, chunk text)."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an Embeddings model with a persistent cache keyed by chunk hash.
+    Only chunks that were never embedded with this model reach the API, so
+    re-indexing an unchanged document is close to free.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, db_path: str = EMBEDDING_CACHE_PATH):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.db_path = db_path
+        with connect(self.db_path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector TEXT NOT NULL)")
+
+    def _lookup(self, keys: list[str]) -> dict:
+        found = {}
+        with connect(self.db_path) as conn:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" for _ in batch)
+                rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+                found.update((key, json.loads(vector)) for key, vector in rows)
+        return found
+
+    def _store(self, items: list[tuple[str, list[float]]]) -> None:
+        with connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, json.dumps(vector)) for key, vector in items]
+            )
+
+    def _split(self, texts: list[str]):
+        keys = [chunk_key(self.model_name, text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+        # Each distinct missing text is embedded once, even if repeated in the batch
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        return keys, cached, missing
+
+    def _merge(self, keys: list[str], cached: dict, missing: list[str], vectors: list) -> list:
+        fresh = [(chunk_key(self.model_name, text), vector) for text, vector in zip(missing, vectors)]
+        if fresh:
+            self._store(fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, cached, missing = self._split(texts)
+        vectors = self.embeddings.embed_documents(missing) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, cached, missing = await asyncio.to_thread(self._split, texts)
+        vectors = await self.embeddings.aembed_documents(missing) if missing else []
+        return await asyncio.to_thread(self._merge, keys, cached, missing, vectors)
+
+    # Query embeddings go through the in-memory question cache instead
+    def embed_query(self, text: str) -> list[float]:
+        vector = query_embedding_cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            query_embedding_cache.put(self.model_name, text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> list[float]:
+        vector = query_embedding_cache.get(self.model_name, text)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            query_embedding_cache.put(self.model_name, text, vector)
+        return vector
@@ -0,0 +1,195 @@
+import json
+import mmap
+import os
+import shutil
+import time
+import uuid
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+
+CHUNKS_FILENAME = "chunks.bin"
+OFFSETS_FILENAME = "chunks.offsets.npy"
+# Flat codes can be mapped zero-copy only by newer FAISS releases
+HAS_MMAP_IFC = hasattr(faiss, "IO_FLAG_MMAP_IFC")
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+# A store directory holds one subdirectory per saved version and a pointer
+# file naming the current one. Files are never rewritten in place, so readers
+# that have a version mapped keep a consistent set until they reopen.
+CURRENT_FILENAME = "CURRENT"
+VERSION_PREFIX = "v-"
+# Files that stores saved before versioning keep directly in the store directory
+_LEGACY_FILENAMES = ("index.faiss", "index.pkl", CHUNKS_FILENAME, OFFSETS_FILENAME, "bm25.json")
+
+
+def store_dir(db_path: str) -> str:
+    """Directory holding the current files of a store (db_path itself for unversioned stores)."""
+    try:
+        with open(os.path.join(db_path, CURRENT_FILENAME), encoding="utf-8") as f:
+            return os.path.join(db_path, f.read().strip())
+    except FileNotFoundError:
+        return db_path
+
+
+def new_version_dir(db_path: str) -> str:
+    """Empty directory for the next version of a store; invisible to readers until published."""
+    # Names sort by creation time
+    directory = os.path.join(db_path, f"{VERSION_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}")
+    os.makedirs(directory)
+    return directory
+
+
+def publish_version(db_path: str, directory: str) -> None:
+    """
+    Make a fully written version current with one atomic rename of the
+    pointer file. The version it replaces is kept for readers that are
+    still opening it; anything older is removed.
+    """
+    previous = os.path.basename(store_dir(db_path))
+    pointer = os.path.join(db_path, CURRENT_FILENAME)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(os.path.basename(directory))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)
+
+    if not previous.startswith(VERSION_PREFIX):
+        # First versioned save: the unversioned files are the ones kept
+        return
+    # Unlinking mapped files is safe: readers keep their pages until they close them
+    for name in _LEGACY_FILENAMES:
+        try:
+            os.remove(os.path.join(db_path, name))
+        except OSError:
+            pass
+    for name in os.listdir(db_path):
+        if name.startswith(VERSION_PREFIX) and name < previous:
+            shutil.rmtree(os.path.join(db_path, name), ignore_errors=True)
+
+
+def write_chunk_store(directory: str, texts: list, metadatas: list) -> None:
+    """
+    Write chunk records as one blob of UTF-8 JSON records plus an array of
+    their byte offsets, both of which can be memory-mapped read-only.
+    """
+    offsets = np.zeros(len(texts) + 1, dtype="uint64")
+    blob_path = os.path.join(directory, CHUNKS_FILENAME)
+    with open(blob_path + ".tmp", "wb") as f:
+        for position, (text, metadata) in enumerate(zip(texts, metadatas)):
+            record = json.dumps({"text": text, "metadata": metadata}).encode("utf-8")
+            f.write(record)
+            offsets[position + 1] = offsets[position] + len(record)
+    offsets_path = os.path.join(directory, OFFSETS_FILENAME)
+    # np.save appends .npy to names that lack it
+    np.save(offsets_path + ".tmp.npy", offsets)
+    os.replace(blob_path + ".tmp", blob_path)
+    os.replace(offsets_path + ".tmp.npy", offsets_path)
+
+
+def has_chunk_store(directory: str) -> bool:
+    return os.path.exists(os.path.join(directory, OFFSETS_FILENAME))
+
+
+class _Column:
+    """Read-only sequence view of one field of a ChunkStore."""
+
+    def __init__(self, store: "ChunkStore", field: str):
+        self.store = store
+        self.field = field
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __getitem__(self, position: int):
+        return self.store.record(position)[self.field]
+
+    def __iter__(self):
+        for position in range(len(self.store)):
+            yield self[position]
+
+
+class ChunkStore:
+    """Chunk records decoded on access from a memory-mapped blob."""
+
+    def __init__(self, directory: str):
+        self.offsets = np.load(os.path.join(directory, OFFSETS_FILENAME), mmap_mode="r")
+        self._blob = None
+        if len(self) and self.offsets[-1]:
+            with open(os.path.join(directory, CHUNKS_FILENAME), "rb") as f:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.texts = _Column(self, "text")
+        self.metadatas = _Column(self, "metadata")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def record(self, position: int) -> dict:
+        start, end = int(self.offsets[position]), int(self.offsets[position + 1])
+        return json.loads(self._blob[start:end])
+
+    def document(self, position: int) -> Document:
+        record = self.record(position)
+        return Document(page_content=record["text"], metadata=record["metadata"])
+
+
+def _matches(metadata: dict, filter: dict) -> bool:
+    for key, value in filter.items():
+        allowed = value if isinstance(value, list) else [value]
+        if metadata.get(key) not in allowed:
+            return False
+    return True
+
+
+def _is_mapped(index) -> bool:
+    """
+    Whether read_index(MMAP_FLAGS) left the index's vectors in the mapped file.
+    Only FAISS releases with IO_FLAG_MMAP_IFC map codes zero-copy; older ones
+    accept the flags but still copy them onto the heap. HNSW graphs are
+    always read into memory.
+    """
+    if not HAS_MMAP_IFC:
+        return False
+    flat_codes = getattr(faiss, "IndexFlatCodes", None)
+    if flat_codes is not None and isinstance(index, flat_codes):
+        return True
+    return faiss.try_extract_index_ivf(index) is not None
+
+
+class MappedVectorStore:
+    """
+    Read-only vector store over a memory-mapped FAISS index and chunk store.
+    Opening one reads no vectors or chunk text; pages come from the OS page
+    cache, shared by every worker process, as searches touch them.
+    """
+
+    def __init__(self, directory: str, embeddings):
+        self.embeddings = embeddings
+        index_path = os.path.join(directory, "index.faiss")
+        try:
+            self.index = faiss.read_index(index_path, MMAP_FLAGS)
+            self.mapped = _is_mapped(self.index)
+        except RuntimeError:
+            # Index types FAISS cannot map are read into memory as before
+            self.index = faiss.read_index(index_path)
+            self.mapped = False
+        # Process memory taken by the index: mapped pages belong to the shared page cache
+        self.memory_bytes = 0 if self.mapped else os.path.getsize(index_path)
+        self.chunks = ChunkStore(directory)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None, fetch_k: int = 20) -> list:
+        if not self.index.ntotal:
+            return []
+        vector = np.array([self.embeddings.embed_query(query)], dtype="float32")
+        _, positions = self.index.search(vector, min(max(fetch_k, k) if filter else k, self.index.ntotal))
+        docs = []
+        for position in positions[0]:
+            if position < 0:
+                continue
+            doc = self.chunks.document(int(position))
+            if filter and not _matches(doc.metadata, filter):
+                continue
+            docs.append(doc)
+            if len(docs) == k:
+                break
+        return docs
@@ -1,14 +1,11 @@
-import fitz  # PyMuPDF
-import re
+from pdf.pdf_utils import extract_pages
+from document.chunker import chunk_pages
 
-def extract_text_from_pdf(pdf_path: str, chunk_size: int = 500) -> list:
-    doc = fitz.open(pdf_path)
-    full_text = ""
+def extract_chunks_from_pdf(pdf_path: str, file_hash: str = None) -> tuple[list, list]:
+    """Structure-aware chunks of a PDF and their page/heading metadata."""
+    # Pages are extracted in parallel; page boundaries are kept for metadata
+    return chunk_pages(extract_pages(pdf_path, file_hash=file_hash))
 
-    for page in doc:
-        full_text += page.get_text()
-
-    # Clean and chunk
-    full_text = re.sub(r'\s+', ' ', full_text).strip()
-    chunks = [full_text[i:i+chunk_size] for i in range(0, len(full_text), chunk_size)]
+def extract_text_from_pdf(pdf_path: str) -> list:
+    chunks, _ = extract_chunks_from_pdf(pdf_path)
     return chunks
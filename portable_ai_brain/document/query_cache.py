@@ -0,0 +1,182 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+import numpy as np
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# Cosine similarity above which a different question reuses a cached answer; 0 disables
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+
+def normalize_question(question: str) -> str:
+    """Case, whitespace and trailing punctuation do not make a new question."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+def _unit(vector: list) -> np.ndarray:
+    """float32 copy scaled to length 1, so a dot product is the cosine similarity."""
+    vector = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Stats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def as_dict(self, size: int) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class QueryEmbeddingCache:
+    """Level 1: normalized question text -> query embedding (LRU)."""
+
+    def __init__(self, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = _Stats()
+
+    def get(self, model: str, question: str):
+        key = (model, normalize_question(question))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return vector
+
+    def put(self, model: str, question: str, vector: list) -> None:
+        with self._lock:
+            self._entries[(model, normalize_question(question))] = vector
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats_dict(self) -> dict:
+        return self.stats.as_dict(len(self._entries))
+
+
+class AnswerCache:
+    """
+    Level 2: (document id, question, model) -> final answer, with TTL and
+    LRU eviction. With a similarity threshold, a question whose embedding
+    is close enough to a cached one for the same document and model hits too.
+    Those are scored with one matrix product per (document, model), against
+    a snapshot built after the group last changed, outside the lock.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity_threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        # key -> (expires_at, answer, unit question embedding or None)
+        self._entries: OrderedDict = OrderedDict()
+        # (doc_id, model) -> (keys, matrix of their embeddings), rebuilt after changes
+        self._snapshots: dict = {}
+        self._versions: dict = {}
+        self._lock = threading.Lock()
+        self.stats = _Stats()
+        self.semantic_hits = 0
+
+    def _changed(self, key) -> None:
+        group = (key[0], key[2])
+        self._snapshots.pop(group, None)
+        self._versions[group] = self._versions.get(group, 0) + 1
+
+    def _snapshot(self, group):
+        with self._lock:
+            snapshot = self._snapshots.get(group)
+            if snapshot is not None:
+                return snapshot
+            version = self._versions.get(group, 0)
+            rows = [
+                (key, entry[2]) for key, entry in self._entries.items()
+                if (key[0], key[2]) == group and entry[2] is not None
+            ]
+        keys = [key for key, _ in rows]
+        matrix = np.stack([vector for _, vector in rows]) if rows else None
+        with self._lock:
+            # Only kept if nothing in the group changed while it was built
+            if self._versions.get(group, 0) == version:
+                self._snapshots[group] = (keys, matrix)
+        return keys, matrix
+
+    def _similar(self, doc_id: str, model: str, embedding: list, now: float):
+        keys, matrix = self._snapshot((doc_id, model))
+        if matrix is None:
+            return None
+        scores = matrix @ _unit(embedding)
+        for position in np.argsort(-scores):
+            if scores[position] < self.similarity_threshold:
+                break
+            with self._lock:
+                # The snapshot may hold entries expired or evicted since
+                entry = self._entries.get(keys[position])
+                if entry is not None and entry[0] > now:
+                    return entry[1]
+        return None
+
+    def get(self, doc_id: str, question: str, model: str, embed: Callable[[], list] = None):
+        """
+        Cached answer, or None. `embed()` returns the question embedding; it is
+        only called after an exact miss, when semantic hits are enabled.
+        """
+        key = (doc_id, normalize_question(question), model)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return entry[1]
+
+        # Outside the lock: embedding a question is slow
+        embedding = embed() if self.similarity_threshold and embed is not None else None
+        answer = self._similar(doc_id, model, embedding, now) if embedding is not None else None
+        with self._lock:
+            if answer is not None:
+                self.stats.hits += 1
+                self.semantic_hits += 1
+                return answer
+            self.stats.misses += 1
+            return None
+
+    def put(self, doc_id: str, question: str, model: str, answer, embedding: list = None) -> None:
+        key = (doc_id, normalize_question(question), model)
+        vector = _unit(embedding) if embedding is not None else None
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, answer, vector)
+            self._entries.move_to_end(key)
+            self._changed(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._changed(evicted)
+
+    def stats_dict(self) -> dict:
+        return {**self.stats.as_dict(len(self._entries)), "semantic_hits": self.semantic_hits}
+
+
+query_embedding_cache = QueryEmbeddingCache()
+answer_cache = AnswerCache()
+
+
+def cache_stats() -> dict:
+    return {
+        "query_embeddings": query_embedding_cache.stats_dict(),
+        "answers": answer_cache.stats_dict()
+    }
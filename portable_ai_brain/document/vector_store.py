@@ -1,24 +1,45 @@
+import asyncio
 import os
+import random
+import threading
+from collections import OrderedDict
+from contextlib import aclosing
 from langchain_openai import AzureOpenAIEmbeddings, AzureChatOpenAI
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.docstore.document import Document
 from langchain.chains.question_answering import load_qa_chain
 from dotenv import load_dotenv
+from document.embedding_cache import CachedEmbeddings
+from document.query_cache import answer_cache
+from document.ann_index import make_index, needs_training, apply_search_params
+from document.mapped_store import (
+    OFFSETS_FILENAME, ChunkStore, MappedVectorStore, has_chunk_store, new_version_dir, publish_version, store_dir,
+    write_chunk_store
+)
+from document.bm25 import BM25Index, BM25_FILENAME, tokenize
 
 # Load from .env
 load_dotenv()
 
 # Set up embedding model
-embedding_model = AzureOpenAIEmbeddings(
-    model="text-embedding-ada-002",
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-    azure_deployment=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME"),
-    chunk_size=1000
+EMBEDDING_MODEL_NAME = "text-embedding-ada-002"
+EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME")
+embedding_model = CachedEmbeddings(
+    AzureOpenAIEmbeddings(
+        model=EMBEDDING_MODEL_NAME,
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        azure_deployment=EMBEDDING_DEPLOYMENT,
+        chunk_size=1000
+    ),
+    # Cache entries are only valid for the model that produced them
+    model_name=f"{EMBEDDING_MODEL_NAME}:{EMBEDDING_DEPLOYMENT}"
 )
 
 # Set up chat model
+ANSWER_MODEL = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME") or "gpt-35-turbo"
 llm = AzureChatOpenAI(
     model="gpt-35-turbo",
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
@@ -28,39 +49,343 @@ llm = AzureChatOpenAI(
     temperature=0,
 )
 
-def create_or_load_vector_store(chunks: list, db_path: str):
-    docs = [Document(page_content=chunk) for chunk in chunks]
-    db = FAISS.from_documents(docs, embedding_model)
-    db.save_local(db_path)
+VECTOR_DB_DIR = "vector_dbs"
+
+def vector_db_path(doc_id: str) -> str:
+    """Location of the FAISS index built for a document."""
+    return os.path.join(VECTOR_DB_DIR, f"{doc_id}.faiss")
+
+# Ingestion: chunks are embedded in batches with several requests in flight
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_SECONDS = float(os.getenv("EMBED_BACKOFF_SECONDS", "1"))
+
+def _is_throttled(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status in (429, 503) or "rate limit" in str(error).lower()
+
+async def _embed_batch(texts: list, semaphore: asyncio.Semaphore) -> list:
+    """Embed one batch, retrying throttled requests with exponential backoff."""
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                return await embedding_model.aembed_documents(texts)
+        except Exception as e:
+            if attempt == EMBED_MAX_RETRIES or not _is_throttled(e):
+                raise
+            # Full jitter so concurrent batches do not retry in lockstep
+            delay = EMBED_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"Embedding batch throttled, retrying in {delay:.1f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+async def embedded_batches(chunks: list, progress=None):
+    """
+    Embed chunks in batches of EMBED_BATCH_SIZE, up to EMBED_MAX_CONCURRENCY
+    batches at a time, yielding (start, vectors) as each batch completes.
+    `progress(done, total)` is called after every batch.
+    """
+    semaphore = asyncio.Semaphore(max(1, EMBED_MAX_CONCURRENCY))
+
+    async def embed(start: int):
+        texts = chunks[start:start + EMBED_BATCH_SIZE]
+        return start, await _embed_batch(texts, semaphore)
+
+    tasks = [asyncio.ensure_future(embed(start)) for start in range(0, len(chunks), EMBED_BATCH_SIZE)]
+    done = 0
+    try:
+        for next_batch in asyncio.as_completed(tasks):
+            start, batch_vectors = await next_batch
+            done += len(batch_vectors)
+            if progress:
+                progress(done, len(chunks))
+            yield start, batch_vectors
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def embed_chunks(chunks: list, progress=None) -> list:
+    """All vectors of embedded_batches(), in chunk order."""
+    vectors = [None] * len(chunks)
+    async with aclosing(embedded_batches(chunks, progress)) as batches:
+        async for start, batch_vectors in batches:
+            vectors[start:start + len(batch_vectors)] = batch_vectors
+    return vectors
+
+async def build_vector_store(chunks: list, db_path: str, metadatas: list = None, progress=None):
+    """
+    Embed chunks (see embedded_batches()) and index them with the configured
+    FAISS index type (see document/ann_index.py). Flat and HNSW indexes get
+    each batch as soon as it is embedded. Returns the index.
+    """
+    if not chunks:
+        raise ValueError("No text chunks to index")
+    metadatas = metadatas or [{} for _ in chunks]
+
+    def new_store(index):
+        return FAISS(embedding_function=embedding_model, index=index, docstore=InMemoryDocstore(), index_to_docstore_id={})
+
+    if needs_training(len(chunks)):
+        # IVF/PQ indexes must be trained before vectors are added, so collect them all first
+        vectors = await embed_chunks(chunks, progress)
+
+        def build():
+            db = new_store(make_index(vectors))
+            db.add_embeddings(list(zip(chunks, vectors)), metadatas=metadatas)
+            save_vector_store(db, db_path)
+            return db
+
+        return await asyncio.to_thread(build)
+
+    db = None
+    async with aclosing(embedded_batches(chunks, progress)) as batches:
+        async for start, vectors in batches:
+            if db is None:
+                db = new_store(make_index(vectors, n_vectors=len(chunks)))
+            end = start + len(vectors)
+            await asyncio.to_thread(db.add_embeddings, list(zip(chunks[start:end], vectors)), metadatas=metadatas[start:end])
+    await asyncio.to_thread(save_vector_store, db, db_path)
+    return db
+
+def save_vector_store(db, db_path: str) -> None:
+    """
+    Write a LangChain FAISS store: the FAISS files (kept for writers that
+    update the store), a memory-mappable copy of its chunks for readers, and
+    the BM25 index over the same chunks. The whole set goes into a new
+    version directory that replaces the current one atomically (see
+    publish_version()), so readers never see a mix of old and new files.
+    """
+    directory = new_version_dir(db_path)
+    db.save_local(directory)
+    docs = [db.docstore.search(db.index_to_docstore_id[i]) for i in range(db.index.ntotal)]
+    texts = [doc.page_content for doc in docs]
+    metadatas = [doc.metadata for doc in docs]
+    write_chunk_store(directory, texts, metadatas)
+    BM25Index.build(texts, metadatas).save(directory, include_chunks=False)
+    publish_version(db_path, directory)
+
+def has_vector_store(db_path: str) -> bool:
+    """Whether a complete index has been saved at db_path."""
+    return os.path.exists(os.path.join(store_dir(db_path), "index.faiss"))
+
+def create_or_load_vector_store(chunks: list, db_path: str, metadatas: list = None):
+    """Synchronous wrapper around build_vector_store() for non-async callers."""
+    asyncio.run(build_vector_store(chunks, db_path, metadatas))
+
+# Loaded indexes, most recently used last: db_path -> (file stamp, size in bytes, FAISS)
+_index_cache = OrderedDict()
+_index_cache_bytes = 0
+_index_cache_lock = threading.Lock()
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv("VECTOR_STORE_CACHE_SIZE", "16"))
+INDEX_CACHE_MAX_BYTES = int(float(os.getenv("VECTOR_STORE_CACHE_MB", "512")) * 1024 * 1024)
+
+def _index_stamp(directory: str) -> tuple[tuple, int]:
+    """
+    (stamp, total size) of the files save_vector_store() writes for an index,
+    given the store_dir() of its current version. A new version changes the stamp.
+    """
+    stamps, size = [os.path.basename(directory)], 0
+    names = ["index.faiss", "index.pkl"]
+    if has_chunk_store(directory):
+        names.append(OFFSETS_FILENAME)
+    for name in names:
+        stat = os.stat(os.path.join(directory, name))
+        stamps.append(stat.st_mtime_ns)
+        size += stat.st_size
+    return tuple(stamps), size
+
+def _evict_indexes():
+    global _index_cache_bytes
+    while _index_cache and (len(_index_cache) > INDEX_CACHE_MAX_ENTRIES or _index_cache_bytes > INDEX_CACHE_MAX_BYTES):
+        _, (_, size, _) = _index_cache.popitem(last=False)
+        _index_cache_bytes -= size
+
+def load_vector_store(db_path: str):
+    """
+    Return the vector store at db_path for searching, opening it only when
+    it is not cached or a new version was saved since it was loaded.
+    Stores with a chunk file are memory-mapped (MappedVectorStore); older
+    ones are deserialized into LangChain's FAISS wrapper.
+    """
+    global _index_cache_bytes
+    key = os.path.abspath(db_path)
+    directory = store_dir(db_path)
+    stamp, size = _index_stamp(directory)
+    with _index_cache_lock:
+        entry = _index_cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            _index_cache.move_to_end(key)
+            return entry[2]
+
+    if has_chunk_store(directory):
+        db = MappedVectorStore(directory, embedding_model)
+        # Chunks stay mapped; only an index FAISS could not map counts against the cache budget
+        size = db.memory_bytes
+    else:
+        # The index and its docstore pickle are written by this app, so loading them is trusted
+        db = FAISS.load_local(directory, embedding_model, allow_dangerous_deserialization=True)
+    apply_search_params(db.index)
+
+    with _index_cache_lock:
+        previous = _index_cache.pop(key, None)
+        if previous is not None:
+            _index_cache_bytes -= previous[1]
+        _index_cache[key] = (stamp, size, db)
+        _index_cache_bytes += size
+        _evict_indexes()
+    return db
+
+def warm_vector_stores(db_paths: list) -> int:
+    """Load the given indexes into the cache ahead of the first query."""
+    loaded = 0
+    for db_path in db_paths:
+        try:
+            load_vector_store(db_path)
+            loaded += 1
+        except Exception as e:
+            print(f"Could not warm vector store {db_path}: {e}")
+    return loaded
+
+# Retrieval: "hybrid" (BM25 + vectors), "lexical" (BM25 only) or "vector"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Queries with this many terms or fewer, all present in the index, skip the embedding call
+LEXICAL_ONLY_MAX_TERMS = int(os.getenv("LEXICAL_ONLY_MAX_TERMS", "3"))
+RRF_K = 60
+
+_bm25_cache = {}
+_bm25_cache_lock = threading.Lock()
+
+def load_bm25(db_path: str):
+    """The BM25 index stored with a vector store, or None for older indexes."""
+    directory = store_dir(db_path)
+    path = os.path.join(directory, BM25_FILENAME)
+    try:
+        stamp = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return None
+    key = os.path.abspath(db_path)
+    with _bm25_cache_lock:
+        entry = _bm25_cache.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+    index = BM25Index.load(directory, ChunkStore(directory) if has_chunk_store(directory) else None)
+    with _bm25_cache_lock:
+        # Kept alongside the FAISS cache, so bound it the same way
+        if key not in _bm25_cache and len(_bm25_cache) >= INDEX_CACHE_MAX_ENTRIES:
+            _bm25_cache.pop(next(iter(_bm25_cache)))
+        _bm25_cache[key] = (stamp, index)
+    return index
+
+def _fuse(rankings: list, k: int) -> list:
+    """Reciprocal rank fusion of several ranked Document lists."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [docs[key] for key in best]
+
+# Candidates scanned by a filtered vector search before the filter is applied
+FILTER_FETCH_K = int(os.getenv("VECTOR_FILTER_FETCH_K", "200"))
+
+def _vector_search(db_path: str, query: str, k: int, doc_ids: list = None) -> list:
+    db = load_vector_store(db_path)
+    if not doc_ids:
+        return db.similarity_search(query, k=k)
+    return db.similarity_search(query, k=k, filter={"doc_id": list(doc_ids)}, fetch_k=max(FILTER_FETCH_K, k))
+
+def hybrid_search(db_path: str, query: str, k: int = 5, mode: str = None, doc_ids: list = None) -> list:
+    """
+    Top-k chunks for a query, combining BM25 and vector similarity.
+    Short queries whose terms all occur in the document are answered from
+    BM25 alone, without a round-trip to the embeddings API. With doc_ids,
+    only chunks of those documents (collections) are returned.
+    """
+    mode = mode or RETRIEVAL_MODE
+    bm25 = load_bm25(db_path) if mode != "vector" else None
+    if bm25 is None:
+        return _vector_search(db_path, query, k, doc_ids)
+
+    allowed = bm25.positions_for(doc_ids) if doc_ids else None
+    lexical = [
+        Document(page_content=bm25.texts[position], metadata=bm25.metadatas[position])
+        for position, _ in bm25.search(query, k * 2, allowed)
+    ]
+    if mode == "lexical" or (lexical and len(tokenize(query)) <= LEXICAL_ONLY_MAX_TERMS and bm25.covers(query)):
+        return lexical[:k]
+
+    vector = _vector_search(db_path, query, k * 2, doc_ids)
+    return _fuse([lexical, vector], k)
+
+def search_vector_store(db_path: str, query: str, k: int = 5, doc_ids: list = None) -> list:
+    """Return the k chunks (LangChain Documents) most relevant to the query."""
+    return hybrid_search(db_path, query, k, doc_ids=doc_ids)
+
+def _generate_recommendations(db_path: str, question: str, doc_ids: list = None) -> list:
+    relevant_docs = hybrid_search(db_path, question, k=5, doc_ids=doc_ids)  # Get top 5 relevant documents
+    
+    # Generate 3-5 follow-up question recommendations based on retrieved content
+    prompt = f"""
+    Based on this query: "{question}" 
+    and the following relevant content:
+    {[doc.page_content[:200] for doc in relevant_docs]}
+    
+    Generate 3-5 follow-up questions that would be helpful for exploring this topic further.
+    Return ONLY the questions as a list, separated by '|'.
+    """
+    
+    from langchain.chains import LLMChain
+    from langchain.prompts import PromptTemplate
+    
+    template = PromptTemplate(template=prompt, input_variables=[])
+    chain = LLMChain(llm=llm, prompt=template)
+    result = chain.run({})
+    
+    # Split recommendations and clean them up
+    recommendations = [rec.strip() for rec in result.split('|') if rec.strip()]
+    return recommendations[:5]  # Return at most 5 recommendations
+
+def _fallback_recommendations() -> list:
+    return ["What else can you tell me about this topic?", 
+            "Can you explain this in more detail?",
+            "What are the practical applications of this?"]
+
+def query_vector_store(db_path: str, question: str, doc_ids: list = None) -> list:
+    try:
+        return _generate_recommendations(db_path, question, doc_ids)
+    except Exception as e:
+        print(f"Error generating recommendations: {e}")
+        return _fallback_recommendations()
+
+def cached_query_vector_store(doc_id: str, db_path: str, question: str, doc_ids: list = None) -> list:
+    """
+    query_vector_store() behind the answer cache. Entries are keyed by the
+    index's file stamp too, so rebuilding an index never serves stale answers.
+    """
+    try:
+        cache_doc_id = f"{doc_id}@{_index_stamp(store_dir(db_path))[0]}"
+    except OSError:
+        # No index on disk: nothing worth caching
+        return query_vector_store(db_path, question, doc_ids)
+    if doc_ids:
+        cache_doc_id += f"[{','.join(sorted(doc_ids))}]"
+    embedding = None
+
+    def embed():
+        # Only needed for semantic (near-duplicate) hits, after an exact miss
+        nonlocal embedding
+        embedding = embedding_model.embed_query(question)
+        return embedding
 
-def query_vector_store(db_path: str, question: str) -> list:
     try:
-        db = FAISS.load_local(db_path, embedding_model)
-        retriever = db.as_retriever(search_kwargs={"k": 5})  # Get top 5 relevant documents
-        relevant_docs = retriever.get_relevant_documents(question)
-        
-        # Generate 3-5 follow-up question recommendations based on retrieved content
-        prompt = f"""
-        Based on this query: "{question}" 
-        and the following relevant content:
-        {[doc.page_content[:200] for doc in relevant_docs]}
-        
-        Generate 3-5 follow-up questions that would be helpful for exploring this topic further.
-        Return ONLY the questions as a list, separated by '|'.
-        """
-        
-        from langchain.chains import LLMChain
-        from langchain.prompts import PromptTemplate
-        
-        template = PromptTemplate(template=prompt, input_variables=[])
-        chain = LLMChain(llm=llm, prompt=template)
-        result = chain.run({})
-        
-        # Split recommendations and clean them up
-        recommendations = [rec.strip() for rec in result.split('|') if rec.strip()]
-        return recommendations[:5]  # Return at most 5 recommendations
+        answer = answer_cache.get(cache_doc_id, question, ANSWER_MODEL, embed)
+        if answer is not None:
+            return answer
+        answer = _generate_recommendations(db_path, question, doc_ids)
     except Exception as e:
         print(f"Error generating recommendations: {e}")
-        return ["What else can you tell me about this topic?", 
-                "Can you explain this in more detail?",
-                "What are the practical applications of this?"]
+        return _fallback_recommendations()
+    answer_cache.put(cache_doc_id, question, ANSWER_MODEL, answer, embedding)
+    return answer
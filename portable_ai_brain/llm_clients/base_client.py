@@ -1,6 +1,23 @@
+import asyncio
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterator
 
 class BaseLLMClient(ABC):
     @abstractmethod
     def call(self, prompt: str) -> str:
-        pass
\ No newline at end of file
+        pass
+
+    async def acall(self, prompt: str) -> str:
+        """Async variant of call(). Clients override this with a native
+        implementation; the default keeps the event loop free by running
+        the blocking call in a worker thread."""
+        return await asyncio.to_thread(self.call, prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the completion in pieces as they are generated. Clients
+        without native streaming yield the whole answer at once."""
+        yield self.call(prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Async variant of stream()."""
+        yield await self.acall(prompt)
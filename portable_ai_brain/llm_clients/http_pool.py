@@ -0,0 +1,42 @@
+import os
+import httpx
+
+# Shared, keep-alive HTTP clients used by every LLM client.
+# Creating a client per request throws away the connection pool (and the TLS
+# handshake with it), so all calls go through these two module-level instances.
+HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "120"))
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=30.0,
+)
+
+_sync_client = None
+_async_client = None
+
+
+def get_http_client() -> httpx.Client:
+    """Return the shared synchronous HTTP client, creating it on first use."""
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return _sync_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Return the shared asynchronous HTTP client, creating it on first use."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+    return _async_client
+
+
+async def close_http_clients():
+    """Close the shared clients. Called on application shutdown."""
+    global _sync_client, _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _sync_client is not None:
+        _sync_client.close()
+        _sync_client = None
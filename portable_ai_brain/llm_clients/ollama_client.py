@@ -1,15 +1,70 @@
 from llm_clients.base_client import BaseLLMClient
-import requests
+from llm_clients.http_pool import get_http_client, get_async_http_client
+import json
+import os
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
 class OllamaClient(BaseLLMClient):
+    model = "mistral"
+    display_name = "Ollama"
+
+    def _payload(self, prompt: str, stream: bool = False) -> dict:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream
+        }
+
     def call(self, prompt: str) -> str:
         try:
-            response = requests.post("http://localhost:11434/api/generate", json={
-                "model": "mistral",
-                "prompt": prompt,
-                "stream": False
-            })
+            response = get_http_client().post(f"{OLLAMA_BASE_URL}/api/generate", json=self._payload(prompt))
+            response.raise_for_status()
+            return response.json().get("response", f"No response from {self.display_name}")
+        except Exception as e:
+            return f"Error calling {self.display_name}: {str(e)}"
+
+    async def acall(self, prompt: str) -> str:
+        try:
+            client = get_async_http_client()
+            response = await client.post(f"{OLLAMA_BASE_URL}/api/generate", json=self._payload(prompt))
             response.raise_for_status()
-            return response.json().get("response", "No response from Ollama")
+            return response.json().get("response", f"No response from {self.display_name}")
+        except Exception as e:
+            return f"Error calling {self.display_name}: {str(e)}"
+
+    def stream(self, prompt: str):
+        # /api/generate streams newline-delimited JSON objects, one per token batch
+        try:
+            with get_http_client().stream("POST", f"{OLLAMA_BASE_URL}/api/generate", json=self._payload(prompt, stream=True)) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
+        except Exception as e:
+            # Raise rather than yield the message, so it is not mistaken for part of the answer
+            print(f"Error streaming from {self.display_name}: {str(e)}")
+            raise
+
+    async def astream(self, prompt: str):
+        try:
+            client = get_async_http_client()
+            async with client.stream("POST", f"{OLLAMA_BASE_URL}/api/generate", json=self._payload(prompt, stream=True)) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        break
         except Exception as e:
-            return f"Error calling Ollama: {str(e)}"
\ No newline at end of file
+            # Raise rather than yield the message, so it is not mistaken for part of the answer
+            print(f"Error streaming from {self.display_name}: {str(e)}")
+            raise
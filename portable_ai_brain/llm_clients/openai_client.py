@@ -1,47 +1,118 @@
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
 import os
 from dotenv import load_dotenv
 from llm_clients.base_client import BaseLLMClient
+from llm_clients.http_pool import get_http_client, get_async_http_client
 
 # Load environment variables from .env file
 load_dotenv()
 
-def get_client():
-    """Create and return an Azure OpenAI client."""
+SYSTEM_PROMPT = "You are a helpful assistant that responds using the user's personal context."
+
+_client = None
+_async_client = None
+
+def _client_settings() -> dict:
     api_key = os.getenv("AZURE_OPENAI_API_KEY")
     endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
     api_version = os.getenv("AZURE_OPENAI_API_VERSION", "2023-07-01-preview")
-    
+
     if not api_key:
         raise ValueError("AZURE_OPENAI_API_KEY environment variable is not set")
     if not endpoint:
         endpoint = "https://my-portable-brain.openai.azure.com"
 
-    return AzureOpenAI(
-        api_key=api_key,
-        api_version=api_version,
-        azure_endpoint=endpoint
-    )
+    return {
+        "api_key": api_key,
+        "api_version": api_version,
+        "azure_endpoint": endpoint
+    }
+
+def get_client():
+    """Return the shared Azure OpenAI client (pooled connections)."""
+    global _client
+    if _client is None:
+        _client = AzureOpenAI(http_client=get_http_client(), **_client_settings())
+    return _client
+
+def get_async_client():
+    """Return the shared async Azure OpenAI client (pooled connections)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncAzureOpenAI(http_client=get_async_http_client(), **_client_settings())
+    return _async_client
+
+def reset_clients():
+    """Drop the cached clients so they are rebuilt on next use (e.g. after the
+    shared HTTP clients were closed)."""
+    global _client, _async_client
+    _client = None
+    _async_client = None
+
+def _completion_kwargs(prompt: str, stream: bool = False) -> dict:
+    deployment_name = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "gpt-35-turbo")
+    print(f"Making OpenAI API call with deployment: {deployment_name}")
+    return {
+        "model": deployment_name,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 1500,
+        "stream": stream
+    }
+
+def _delta_text(chunk) -> str:
+    # Azure sends a leading chunk with no choices (content filter results)
+    if not chunk.choices:
+        return ""
+    return chunk.choices[0].delta.content or ""
 
 class OpenAIClient(BaseLLMClient):
     def call(self, prompt: str) -> str:
         try:
             client = get_client()
-            deployment_name = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME", "gpt-35-turbo")
-            
-            print(f"Making OpenAI API call with deployment: {deployment_name}")
-            response = client.chat.completions.create(
-                model=deployment_name,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that responds using the user's personal context."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7,
-                max_tokens=1500
-            )
+            response = client.chat.completions.create(**_completion_kwargs(prompt))
+            return response.choices[0].message.content
+        except Exception as e:
+            import traceback
+            print(f"Error calling OpenAI API: {str(e)}")
+            print(traceback.format_exc())
+            return f"Error calling OpenAI API: {str(e)}"
+
+    async def acall(self, prompt: str) -> str:
+        try:
+            client = get_async_client()
+            response = await client.chat.completions.create(**_completion_kwargs(prompt))
             return response.choices[0].message.content
         except Exception as e:
             import traceback
             print(f"Error calling OpenAI API: {str(e)}")
             print(traceback.format_exc())
-            return f"Error calling OpenAI API: {str(e)}"
\ No newline at end of file
+            return f"Error calling OpenAI API: {str(e)}"
+
+    def stream(self, prompt: str):
+        try:
+            client = get_client()
+            for chunk in client.chat.completions.create(**_completion_kwargs(prompt, stream=True)):
+                text = _delta_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            # Raise rather than yield the message, so it is not mistaken for part of the answer
+            print(f"Error streaming from OpenAI API: {str(e)}")
+            raise
+
+    async def astream(self, prompt: str):
+        try:
+            client = get_async_client()
+            response = await client.chat.completions.create(**_completion_kwargs(prompt, stream=True))
+            async for chunk in response:
+                text = _delta_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            # Raise rather than yield the message, so it is not mistaken for part of the answer
+            print(f"Error streaming from OpenAI API: {str(e)}")
+            raise
@@ -5,18 +5,23 @@ from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from langchain.chat_models import AzureChatOpenAI
+from document.embedding_cache import CachedEmbeddings
 import os
 
 def build_pdf_qa_chain(text: str):
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
     chunks = splitter.create_documents([text])
 
-    embeddings = OpenAIEmbeddings(
-        openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        openai_api_base=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        openai_api_type="azure",
-        openai_api_version="2023-05-15",
-        deployment=os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT_NAME")
+    embeddings = CachedEmbeddings(
+        OpenAIEmbeddings(
+            openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            openai_api_base=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            openai_api_type="azure",
+            openai_api_version="2023-05-15",
+            deployment=deployment
+        ),
+        model_name=f"azure:{deployment}"
     )
 
     vectordb = FAISS.from_documents(chunks, embeddings)
@@ -1,25 +1,190 @@
 import fitz  # PyMuPDF
+import hashlib
 import os
 import uuid
 import logging
+import multiprocessing
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 import pytesseract
+from document.doc_store import document_store
+from utils.sqlite_store import connect
+from utils.uploads import UPLOAD_CHUNK_SIZE
 
 logging.basicConfig(level=logging.INFO)
 
+# Page text extraction is spread over a process pool, in ranges of pages
+EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PAGES_PER_EXTRACT_TASK = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "20"))
+# Process pools by name, created on first use and replaced if a worker dies
+_pools: dict[str, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
 
-def extract_text_from_pdf(file_path):
-    text_by_page = []
+# OCR fallback for pages without a text layer (scanned documents); on by
+# default only where the tesseract binary is installed
+OCR_ENABLED = os.getenv("PDF_OCR_ENABLED", str(shutil.which("tesseract") is not None)).lower() == "true"
+# OCR has its own pool, so slow or failing OCR never holds up text extraction
+OCR_WORKERS = int(os.getenv("PDF_OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+OCR_DPI = int(os.getenv("PDF_OCR_DPI", "300"))
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.sqlite3")
+
+
+def _extract_page_range(file_path, start, stop):
+    """Text of pages [start, stop). Runs inside a worker process."""
+    with fitz.open(file_path) as doc:
+        return [doc[page_num].get_text() for page_num in range(start, stop)]
+
+
+def _get_pool(name, workers):
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            # spawn, not fork: pools are created from threadpool threads of a
+            # multithreaded server, and forked children would inherit its locks
+            # and every model already loaded into memory
+            pool = _pools[name] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return pool
+
+
+def _discard_pool(name, pool):
+    with _pools_lock:
+        if _pools.get(name) is pool:
+            del _pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _pool_map(name, workers, func, *iterables):
+    """
+    list(map(func, *iterables)) in the named process pool, in order. A pool
+    broken by a dead worker (OOM, a crash on a malformed PDF) is replaced
+    and the call retried once, so one bad file cannot break later ones.
+    """
+    iterables = [list(iterable) for iterable in iterables]
+    for attempt in range(2):
+        pool = _get_pool(name, workers)
+        try:
+            return list(pool.map(func, *iterables))
+        except BrokenProcessPool:
+            _discard_pool(name, pool)
+            if attempt:
+                raise
+            logging.warning(f"Worker process of the {name} pool died; restarting the pool")
+
+
+def shutdown_extract_pool():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+def hash_file(file_path):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _ocr_page(file_path, page_num, dpi):
+    """
+    Render one page and run Tesseract on it, or None if that fails. Runs
+    inside a worker process; errors are not raised because some (e.g.
+    TesseractNotFoundError) cannot be sent back and would break the pool.
+    """
     try:
         with fitz.open(file_path) as doc:
-            logging.info(f"Opened PDF: {file_path}, Total pages: {len(doc)}")
-            for page_num, page in enumerate(doc, start=1):
-                text = page.get_text()
-                if text.strip():
-                    logging.info(f"Extracted text from page {page_num}: {len(text)} characters")
-                    text_by_page.append(text)
-                else:
-                    logging.warning(f"No text found on page {page_num} of {file_path}")
+            pixmap = doc[page_num].get_pixmap(dpi=dpi)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+        return pytesseract.image_to_string(image)
+    except Exception as e:
+        logging.error(f"OCR of page {page_num + 1} of {file_path} failed: {type(e).__name__}: {str(e)}")
+        return None
+
+
+def ocr_empty_pages(file_path, pages, file_hash=None):
+    """
+    Fill in pages that have no text layer using OCR.
+    Only the empty pages are rendered; results are cached per (file hash, page)
+    so a scanned document is OCR'd once. Pass file_hash when it is already
+    known (save_uploaded_pdf returns it) to skip re-reading the file.
+    """
+    empty = [page_num for page_num, text in enumerate(pages) if not text.strip()]
+    if file_hash is None:
+        file_hash = hash_file(file_path)
+    with connect(OCR_CACHE_PATH) as conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages ("
+            "file_hash TEXT NOT NULL, page INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (file_hash, page))"
+        )
+        cached = dict(conn.execute("SELECT page, text FROM ocr_pages WHERE file_hash = ?", (file_hash,)))
+
+    missing = [page_num for page_num in empty if page_num not in cached]
+    if missing:
+        logging.info(f"Running OCR on {len(missing)} pages of {file_path} at {OCR_DPI} dpi")
+        try:
+            texts = _pool_map("ocr", OCR_WORKERS, _ocr_page, [file_path] * len(missing), missing, [OCR_DPI] * len(missing))
+        except Exception as e:
+            logging.error(f"OCR failed for {file_path}: {str(e)}")
+            return pages
+        # Failed pages are not cached, so they are retried once OCR works
+        done = [(page_num, text) for page_num, text in zip(missing, texts) if text is not None]
+        with connect(OCR_CACHE_PATH) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ocr_pages (file_hash, page, text) VALUES (?, ?, ?)",
+                [(file_hash, page_num, text) for page_num, text in done]
+            )
+        cached.update(done)
+
+    pages = list(pages)
+    for page_num in empty:
+        pages[page_num] = cached.get(page_num, "")
+    return pages
+
+
+def extract_pages(file_path, ocr=OCR_ENABLED, file_hash=None):
+    """
+    Text of every page, in page order ("" for pages without a text layer).
+    Large documents are split into page ranges extracted in parallel by a
+    process pool. With ocr=True, pages without text are OCR'd.
+    """
+    with fitz.open(file_path) as doc:
+        page_count = len(doc)
+    logging.info(f"Opened PDF: {file_path}, Total pages: {page_count}")
+
+    if EXTRACT_WORKERS <= 1 or page_count <= PAGES_PER_EXTRACT_TASK:
+        pages = _extract_page_range(file_path, 0, page_count)
+    else:
+        starts = list(range(0, page_count, PAGES_PER_EXTRACT_TASK))
+        stops = [min(start + PAGES_PER_EXTRACT_TASK, page_count) for start in starts]
+        # map() yields results in submission order, so pages stay in order
+        ranges = _pool_map("extract", EXTRACT_WORKERS, _extract_page_range, [file_path] * len(starts), starts, stops)
+        pages = [text for page_texts in ranges for text in page_texts]
+
+    if ocr and any(not text.strip() for text in pages):
+        pages = ocr_empty_pages(file_path, pages, file_hash)
+    return pages
+
+
+def extract_text_from_pdf(file_path, file_hash=None):
+    text_by_page = []
+    try:
+        empty_pages = []
+        for page_num, text in enumerate(extract_pages(file_path, file_hash=file_hash), start=1):
+            if text.strip():
+                text_by_page.append(text)
+            else:
+                empty_pages.append(page_num)
+        logging.info(f"Extracted text from {len(text_by_page)} pages of {file_path}")
+        if empty_pages:
+            logging.warning(f"No text found on pages {empty_pages} of {file_path}")
         if not text_by_page:
             logging.error(f"No extractable text found in the PDF: {file_path}")
         return text_by_page
@@ -31,7 +196,8 @@ def extract_text_from_pdf(file_path):
 def save_uploaded_pdf(file, file_id=None):
     """
     Save the uploaded PDF file to the temp_pdfs directory.
-    Returns the file path where the PDF was saved.
+    The file is copied in chunks and hashed on the way in.
+    Returns (file_path, file_hash) where file_hash is the SHA-256 of the content.
     """
     try:
         temp_dir = "temp_pdfs"
@@ -50,23 +216,65 @@ def save_uploaded_pdf(file, file_id=None):
         # Create the file path with the ID as a prefix
         file_path = os.path.join(temp_dir, f"{file_id}_{safe_filename}")
         
-        # Read and write the file in binary mode
+        # Copy in fixed-size chunks, hashing as we go
+        digest = hashlib.sha256()
         with open(file_path, "wb") as f:
-            # Read file content
-            content = file.file.read()
-            # Verify we have data
-            if not content:
-                raise ValueError("Uploaded file is empty")
-            # Write to disk
-            f.write(content)
+            while True:
+                chunk = file.file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
         
         # Verify the file was saved correctly
         if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
             logging.info(f"PDF saved successfully: {file_path} ({os.path.getsize(file_path)} bytes)")
-            return file_path
+            return file_path, digest.hexdigest()
         else:
-            raise ValueError(f"File was not saved properly to {file_path}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise ValueError("Uploaded file is empty")
             
     except Exception as e:
         logging.error(f"Error saving uploaded PDF: {str(e)}")
-        raise RuntimeError(f"Failed to save uploaded PDF: {str(e)}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to save uploaded PDF: {str(e)}")
+
+
+def dedupe_uploaded_pdf(file_path, file_hash, pdf_id):
+    """
+    Keep a single copy of each distinct PDF.
+    If the content was uploaded before (and is still on disk) the new copy is
+    removed and the earlier upload record is returned with "duplicate": True.
+    Otherwise the new file is registered under pdf_id.
+    """
+    upload = document_store.claim_upload(file_hash, pdf_id, file_path)
+    if upload["duplicate"]:
+        os.remove(file_path)
+        logging.info(f"Duplicate upload of {upload['file_path']} (pdf_id {upload['pdf_id']})")
+    return upload
+
+
+def find_pdf_path(pdf_id, temp_dir="temp_pdfs"):
+    """
+    Path of the stored PDF for pdf_id, or None.
+    Uses the upload index; files saved before the index existed are found
+    by their "{pdf_id}_" prefix once and then recorded by pdf_id, even when
+    another upload already has the same content.
+    """
+    file_path = document_store.find_file(pdf_id)
+    if file_path and os.path.exists(file_path):
+        return file_path
+
+    if not os.path.isdir(temp_dir):
+        return None
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith(f"{pdf_id}_") and entry.is_file():
+                if document_store.record_file(pdf_id, entry.path):
+                    logging.info(f"Indexed legacy PDF {entry.path} for pdf_id {pdf_id}")
+                    file_hash = hash_file(entry.path)
+                    if document_store.find_upload(file_hash) is None:
+                        # Later uploads of the same content reuse this copy
+                        document_store.record_upload(file_hash, pdf_id, entry.path)
+                return entry.path
+    return None
@@ -1,35 +1,87 @@
 from fastapi import APIRouter, UploadFile, File, Form
-from document.pdf_parser import extract_text_from_pdf
-from document.vector_store import create_or_load_vector_store, query_vector_store
+from starlette.concurrency import run_in_threadpool
+from document.pdf_parser import extract_chunks_from_pdf
+from pdf.pdf_utils import save_uploaded_pdf, dedupe_uploaded_pdf
+from document.vector_store import build_vector_store, cached_query_vector_store, has_vector_store, vector_db_path, VECTOR_DB_DIR
+from document.collection_store import (
+    add_to_collection, collection_documents, collection_exists, collection_path, list_collections, remove_from_collection
+)
 import os
 import uuid
 
 router = APIRouter()
-VECTOR_DB_DIR = "vector_dbs"
 os.makedirs(VECTOR_DB_DIR, exist_ok=True)
 
+def _valid_collection(name: str) -> bool:
+    try:
+        collection_path(name)
+        return True
+    except ValueError:
+        return False
+
 # Upload and parse PDF to build vector store
 @router.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(file: UploadFile = File(...), collection: str = Form(None)):
+    if collection and not _valid_collection(collection):
+        return {"error": "Invalid collection name."}
     file_id = uuid.uuid4().hex
-    pdf_path = f"temp_{file_id}.pdf"
+    pdf_path, file_hash = await run_in_threadpool(save_uploaded_pdf, file, file_id)
+
+    # Identical content is stored and indexed once, whichever endpoint saw it first
+    upload = await run_in_threadpool(dedupe_uploaded_pdf, pdf_path, file_hash, file_id)
+    file_id, pdf_path = upload["pdf_id"], upload["file_path"]
+    db_path = vector_db_path(file_id)
+    if has_vector_store(db_path):
+        if collection:
+            await add_to_collection(collection, file_id)
+        return {"file_id": file_id, "message": "PDF already indexed."}
 
-    with open(pdf_path, "wb") as f:
-        f.write(await file.read())
+    text_chunks, metadatas = await run_in_threadpool(extract_chunks_from_pdf, pdf_path, file_hash)
 
-    text_chunks = extract_text_from_pdf(pdf_path)
-    db_path = os.path.join(VECTOR_DB_DIR, f"{file_id}.faiss")
-    create_or_load_vector_store(text_chunks, db_path)
+    def log_progress(done: int, total: int):
+        print(f"Indexing {file_id}: {done}/{total} chunks embedded")
+
+    await build_vector_store(text_chunks, db_path, metadatas, progress=log_progress)
+    if collection:
+        # The chunks were just embedded, so this is all embedding-cache hits
+        await add_to_collection(collection, file_id)
 
-    os.remove(pdf_path)
     return {"file_id": file_id, "message": "PDF uploaded and indexed."}
 
 # Ask question based on PDF context
 @router.post("/ask-pdf")
 async def ask_pdf(file_id: str = Form(...), question: str = Form(...)):
-    db_path = os.path.join(VECTOR_DB_DIR, f"{file_id}.faiss")
-    if not os.path.exists(db_path):
+    db_path = vector_db_path(file_id)
+    if not has_vector_store(db_path):
         return {"error": "Document not found."}
 
-    answer = query_vector_store(db_path, question)
+    answer = await run_in_threadpool(cached_query_vector_store, file_id, db_path, question)
     return {"answer": answer}
+
+# Named collections: several documents in one index, searchable together
+@router.get("/collections")
+async def get_collections():
+    return {"collections": list_collections()}
+
+@router.get("/collections/{name}")
+async def get_collection(name: str):
+    if not _valid_collection(name) or not collection_exists(name):
+        return {"error": "Collection not found."}
+    documents = await run_in_threadpool(collection_documents, name)
+    return {"collection": name, "documents": documents}
+
+@router.post("/collections/{name}/documents")
+async def add_collection_document(name: str, file_id: str = Form(...)):
+    if not _valid_collection(name):
+        return {"error": "Invalid collection name."}
+    if not has_vector_store(vector_db_path(file_id)):
+        return {"error": "Document not found."}
+    chunks = await add_to_collection(name, file_id)
+    return {"collection": name, "file_id": file_id, "chunks": chunks}
+
+@router.delete("/collections/{name}/documents/{file_id}")
+async def remove_collection_document(name: str, file_id: str):
+    if not _valid_collection(name) or not collection_exists(name):
+        return {"error": "Collection not found."}
+    removed = await run_in_threadpool(remove_from_collection, name, file_id)
+    return {"collection": name, "file_id": file_id, "chunks_removed": removed}
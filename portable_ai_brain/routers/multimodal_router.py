@@ -1,103 +1,101 @@
-from fastapi import APIRouter, UploadFile, File, Form
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 import httpx
+import io
 import os
-import shutil
-import uuid
-import subprocess
 import asyncio
-import json
-import re
 
+from PIL import Image
 from vision.vision_client import VisionClient
-from audio.assemblyai_client import AssemblyAIClient
+from vision.caption_batcher import CaptionBatcher
+from vision.caption_cache import CaptionCache, content_hash, dhash
+from audio.assemblyai_client import AssemblyAIClient, TRANSCRIPTION_WEBHOOK_SECRET, WEBHOOK_AUTH_HEADER
+from audio.transcription import TranscriptionFailed
+from audio.video_ingest import VideoDownloadError, normalize_video_url, video_transcript
 from models import get_llm_client
+from utils.uploads import iter_upload
+from utils.jobs import Job, JobQueue
 
 router = APIRouter()
 
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+# Transcription jobs mostly wait on the remote service, so many can run per worker
+TRANSCRIPTION_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CONCURRENCY", "16"))
+# The BLIP model loads on the first image; concurrent requests share batched inference
 vision_client = VisionClient()
+vision_batcher = CaptionBatcher(vision_client)
+# Captions differ per model and backend, so each configuration has its own entries
+caption_cache = CaptionCache(f"{vision_client.model_name}:{vision_client.backend}")
 audio_client = AssemblyAIClient(api_key=ASSEMBLYAI_API_KEY)
+transcription_jobs = JobQueue("transcription", workers=TRANSCRIPTION_CONCURRENCY)
+
+
+async def _await_transcript(job: Job, transcript_id: str) -> dict:
+    job.progress("transcribing")
+    transcript = await audio_client.jobs.wait(transcript_id)
+    return {"text": transcript["text"], "transcript_id": transcript_id}
+
+
+async def _transcribe_video(job: Job, video_url: str) -> dict:
+    text, metadata = await video_transcript(video_url, audio_client, progress=job.progress)
+    return {"text": text, "video_id": metadata.get("id"), "title": metadata.get("title", "")}
+
+
+async def _job_response(job_id: str, wait: bool) -> dict:
+    if not wait:
+        return {"status": "queued", "job_id": job_id}
+    job = await transcription_jobs.wait(job_id)
+    if job["status"] == "completed":
+        return {**job["result"], "status": "completed", "job_id": job_id}
+    return {"error": job["error"], "job_id": job_id}
 
 
 # ✅ Audio file upload transcription
 @router.post("/transcribe-audio")
-async def transcribe_audio(file: UploadFile = File(...)):
-    upload_url = "https://api.assemblyai.com/v2/upload"
-    headers = {"authorization": ASSEMBLYAI_API_KEY}
-    file_bytes = await file.read()
-
-    async with httpx.AsyncClient() as client:
-        upload_response = await client.post(upload_url, content=file_bytes, headers=headers)
-        upload_response.raise_for_status()
-        audio_url = upload_response.json()["upload_url"]
-
-        transcribe_response = await client.post(
-            "https://api.assemblyai.com/v2/transcript",
-            headers=headers,
-            json={"audio_url": audio_url, "auto_chapters": True}
-        )
-        transcribe_response.raise_for_status()
-        transcript_id = transcribe_response.json()["id"]
-
-        status_url = f"https://api.assemblyai.com/v2/transcript/{transcript_id}"
-        while True:
-            poll = await client.get(status_url, headers=headers)
-            poll.raise_for_status()
-            data = poll.json()
-            if data["status"] == "completed":
-                return {"text": data["text"]}
-            elif data["status"] == "error":
-                return {"error": data["error"]}
+async def transcribe_audio(file: UploadFile = File(...), wait: bool = Form(False)):
+    """
+    Upload the audio and queue its transcription. Returns a job_id right away;
+    poll GET /multimodal/jobs/{job_id}. With wait=true the response is held
+    until the transcript is ready.
+    """
+    try:
+        # The upload itself has to finish while the request body is still readable;
+        # it is forwarded as a streamed body instead of being read into memory
+        audio_url = await audio_client.upload(iter_upload(file))
+        transcript_id = await audio_client.request_transcript(audio_url, auto_chapters=True)
+    except httpx.HTTPError as e:
+        return {"error": str(e)}
+
+    job_id = await transcription_jobs.submit("transcribe_audio", _await_transcript, transcript_id)
+    return await _job_response(job_id, wait)
 
 
 # ✅ YouTube video URL transcription
 @router.post("/extract-from-video")
-async def extract_from_video(video_url: str = Form(...)):
-    try:
-        temp_dir = "temp_audio"
-        os.makedirs(temp_dir, exist_ok=True)
-        audio_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}.mp3")
-
-        subprocess.run([
-            "yt-dlp",
-            "-x",
-            "--audio-format", "mp3",
-            "-o", audio_path,
-            video_url
-        ], check=True)
-
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
-
-        upload_url = "https://api.assemblyai.com/v2/upload"
-        headers = {"authorization": ASSEMBLYAI_API_KEY}
-
-        async with httpx.AsyncClient() as client:
-            upload_response = await client.post(upload_url, content=audio_bytes, headers=headers)
-            upload_response.raise_for_status()
-            audio_url = upload_response.json()["upload_url"]
-
-            transcribe_response = await client.post(
-                "https://api.assemblyai.com/v2/transcript",
-                headers=headers,
-                json={"audio_url": audio_url, "auto_chapters": True}
-            )
-            transcribe_response.raise_for_status()
-            transcript_id = transcribe_response.json()["id"]
-
-            status_url = f"https://api.assemblyai.com/v2/transcript/{transcript_id}"
-            while True:
-                poll = await client.get(status_url, headers=headers)
-                poll.raise_for_status()
-                data = poll.json()
-                if data["status"] == "completed":
-                    os.remove(audio_path)
-                    return {"text": data["text"]}
-                elif data["status"] == "error":
-                    return {"error": data["error"]}
+async def extract_from_video(video_url: str = Form(...), wait: bool = Form(False)):
+    """Queue download and transcription of a video; same job/wait contract as /transcribe-audio."""
+    job_id = await transcription_jobs.submit("extract_from_video", _transcribe_video, video_url)
+    return await _job_response(job_id, wait)
 
-    except Exception as e:
-        return {"error": str(e)}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once completed) the result of a transcription job."""
+    job = await transcription_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.post("/transcription-webhook")
+async def transcription_webhook(request: Request):
+    """Completion callback from the transcription service (see TRANSCRIPTION_WEBHOOK_URL)."""
+    if TRANSCRIPTION_WEBHOOK_SECRET and request.headers.get(WEBHOOK_AUTH_HEADER) != TRANSCRIPTION_WEBHOOK_SECRET:
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+    payload = await request.json()
+    # Another worker may own the wait; its fallback poll picks the result up
+    audio_client.jobs.notify(payload.get("transcript_id", ""))
+    return {"received": True}
 
 
 # ✅ Video transcription and summarization
@@ -108,151 +106,52 @@ async def extract_and_summarize_from_video(video_url: str = Form(...)):
         print(f"Processing video URL: {video_url}")
         
         # Normalize YouTube URL
-        if "youtu.be" in video_url:
-            print("Detected shortened YouTube URL")
-            video_id = video_url.split("/")[-1].split("?")[0]
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            print(f"Normalized URL to: {video_url}")
-            
-        temp_dir = "temp_audio"
-        os.makedirs(temp_dir, exist_ok=True)
-        audio_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}.mp3")
+        video_url = normalize_video_url(video_url)
 
-        # Get video metadata first
-        print("Fetching video metadata...")
-        metadata = {}
+        # Using a separate try/except block for download and API calls
         try:
-            metadata_result = subprocess.run([
-                "yt-dlp",
-                "--skip-download",
-                "--print", "%(title)s",
-                "--print", "%(duration)s",
-                "--print", "%(id)s",
-                video_url
-            ], capture_output=True, text=True, check=True)
-            
-            lines = metadata_result.stdout.strip().split('\n')
-            if len(lines) >= 3:
-                metadata["title"] = lines[0]
-                metadata["duration"] = lines[1]
-                metadata["id"] = lines[2]
-                print(f"Video metadata: {metadata}")
-        except Exception as e:
-            print(f"Error fetching metadata: {str(e)}")
-            # Continue even if metadata fetching fails
-
-        print("Downloading video audio...")
-        result = subprocess.run([
-            "yt-dlp",
-            "-x",
-            "--audio-format", "mp3",
-            "-o", audio_path,
-            video_url
-        ], capture_output=True, text=True, check=True)
-        print(f"Download output: {result.stdout}")
-
-        print(f"Reading audio file from: {audio_path}")
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
-
-        upload_url = "https://api.assemblyai.com/v2/upload"
-        headers = {"authorization": ASSEMBLYAI_API_KEY}
-        
-        print("Uploading audio to AssemblyAI...")
-        transcript_id = None
-        
-        # Using a separate try/except block for API calls
-        try:
-            # Use a higher timeout for large audio files
-            async with httpx.AsyncClient(timeout=120.0) as client:
-                # Upload audio file
-                upload_response = await client.post(
-                    upload_url, 
-                    content=audio_bytes, 
-                    headers=headers
-                )
-                upload_response.raise_for_status()
-                audio_url = upload_response.json()["upload_url"]
-                print(f"Uploaded audio. URL: {audio_url}")
-
-                # Request transcription
-                print("Requesting transcription...")
-                transcribe_response = await client.post(
-                    "https://api.assemblyai.com/v2/transcript",
-                    headers=headers,
-                    json={"audio_url": audio_url, "auto_chapters": True}
-                )
-                transcribe_response.raise_for_status()
-                transcript_id = transcribe_response.json()["id"]
-                print(f"Transcription requested. ID: {transcript_id}")
-
-                # Poll for transcription status
-                status_url = f"https://api.assemblyai.com/v2/transcript/{transcript_id}"
-                while True:
-                    print("Polling for transcription status...")
-                    poll = await client.get(status_url, headers=headers)
-                    poll.raise_for_status()
-                    data = poll.json()
-                    print(f"Transcription status: {data['status']}")
-                    
-                    if data["status"] == "completed":
-                        # Clean up the audio file
-                        try:
-                            os.remove(audio_path)
-                            print(f"Deleted audio file: {audio_path}")
-                        except Exception as e:
-                            print(f"Warning: Could not delete audio file: {str(e)}")
-                            
-                        transcript = data["text"]
-                        if not transcript or not transcript.strip():
-                            print("Error: Empty transcript returned")
-                            return {"error": "No transcript found for this video."}
-                        
-                        # Summarize using OpenAI LLM
-                        print("Generating summary with OpenAI...")
-                        llm_client = get_llm_client("openai")
-                        summary_prompt = f"Summarize the following YouTube transcript in concise bullet points:\n\n{transcript}\n\nSummary:"
-                        summary = llm_client.call(summary_prompt)
-                        print(f"Summary generated. Length: {len(summary)}")
-                        
-                        # Format duration if available
-                        duration_str = ""
-                        if "duration" in metadata and metadata["duration"].isdigit():
-                            duration_secs = int(metadata["duration"])
-                            minutes = duration_secs // 60
-                            seconds = duration_secs % 60
-                            duration_str = f"{minutes}:{seconds:02d}"
-                        
-                        return {
-                            "summary": summary, 
-                            "transcript": transcript,
-                            "title": metadata.get("title", ""),
-                            "duration": duration_str
-                        }
-                    elif data["status"] == "error":
-                        print(f"Transcription error: {data.get('error', 'Unknown error')}")
-                        return {"error": data.get("error", "Unknown transcription error")}
-                    
-                    # Add a short delay before the next poll
-                    await asyncio.sleep(3)
+            # One yt-dlp run for metadata and audio; videos seen before come from the cache
+            print("Fetching video transcript...")
+            transcript, metadata = await video_transcript(video_url, audio_client)
+            print(f"Video metadata: {metadata}")
+
+            if not transcript or not transcript.strip():
+                print("Error: Empty transcript returned")
+                return {"error": "No transcript found for this video."}
+
+            # Summarize using OpenAI LLM
+            print("Generating summary with OpenAI...")
+            llm_client = get_llm_client("openai")
+            summary_prompt = f"Summarize the following YouTube transcript in concise bullet points:\n\n{transcript}\n\nSummary:"
+            summary = await llm_client.acall(summary_prompt)
+            print(f"Summary generated. Length: {len(summary)}")
+
+            # Format duration if available
+            duration_str = ""
+            if "duration" in metadata and metadata["duration"].isdigit():
+                duration_secs = int(metadata["duration"])
+                minutes = duration_secs // 60
+                seconds = duration_secs % 60
+                duration_str = f"{minutes}:{seconds:02d}"
+
+            return {
+                "summary": summary, 
+                "transcript": transcript,
+                "title": metadata.get("title", ""),
+                "duration": duration_str
+            }
+        except TranscriptionFailed as e:
+            print(f"Transcription error: {str(e)}")
+            return {"error": str(e)}
+        except VideoDownloadError as e:
+            print(f"Download error: {str(e)}")
+            return {"error": f"Could not download the video: {str(e)}"}
         except httpx.ReadTimeout:
             # Specific handling for timeout errors
             print("Timeout error during API call to AssemblyAI")
-            # Clean up any temporary files
-            try:
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-            except:
-                pass
             return {"error": "Connection timed out when processing the video. Please try again with a shorter video."}
         except Exception as e:
             print(f"API call error: {str(e)}")
-            # Clean up any temporary files
-            try:
-                if os.path.exists(audio_path):
-                    os.remove(audio_path)
-            except:
-                pass
             return {"error": f"Error processing video: {str(e)}"}
             
     except Exception as e:
@@ -262,21 +161,51 @@ async def extract_and_summarize_from_video(video_url: str = Form(...)):
         return {"error": str(e)}
 
 
+async def _caption_upload(data: bytes) -> tuple[str, bool]:
+    """(caption, cached) for an uploaded image, decoded in memory; exact and near-duplicate images skip the model."""
+    sha = content_hash(data)
+    caption = await run_in_threadpool(caption_cache.get_exact, sha)
+    if caption is not None:
+        return caption, True
+
+    def decode():
+        image = Image.open(io.BytesIO(data)).convert("RGB")
+        return image, dhash(image)
+
+    image, image_hash = await run_in_threadpool(decode)
+    caption = await run_in_threadpool(caption_cache.get_similar, image_hash)
+    cached = caption is not None
+    if not cached:
+        caption = await vision_batcher.caption(image)
+    # Remember this exact file too, so the next upload of it is a hash lookup
+    await run_in_threadpool(caption_cache.put, sha, image_hash, caption)
+    return caption, cached
+
+
 # ✅ Image upload captioning
 @router.post("/analyze-image")
 async def analyze_image(file: UploadFile = File(...)):
     try:
-        temp_dir = "temp_images"
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.join(temp_dir, f"{uuid.uuid4().hex}_{file.filename}")
+        caption, cached = await _caption_upload(await file.read())
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        return {"caption": caption, "cached": cached}
+
+    except Exception as e:
+        return {"error": str(e)}
 
-        caption = vision_client.analyze_image(file_path)
-        os.remove(file_path)
 
-        return {"caption": caption}
+# ✅ Multi-image captioning in batched model calls
+@router.post("/analyze-images")
+async def analyze_images(files: list[UploadFile] = File(...)):
+    try:
+        # Uncached images of one request still reach the model as a single batch
+        uploads = [await file.read() for file in files]
+        results = await asyncio.gather(*(_caption_upload(data) for data in uploads))
+
+        return {"captions": [
+            {"filename": file.filename, "caption": caption, "cached": cached}
+            for file, (caption, cached) in zip(files, results)
+        ]}
 
     except Exception as e:
         return {"error": str(e)}
@@ -1,11 +1,19 @@
 from fastapi import APIRouter, UploadFile, File, Form, Request, HTTPException
-from fastapi.responses import FileResponse
-from pdf.pdf_utils import extract_text_from_pdf, save_uploaded_pdf
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+from pdf.pdf_utils import extract_pages, save_uploaded_pdf, dedupe_uploaded_pdf, find_pdf_path
 from utils.context_injector import inject_context
 from utils.task_planner import split_into_subtasks
+from utils.streaming import wants_stream, sse_response
+from utils.jobs import JobQueue
+from utils.file_responses import file_response
+from utils.concurrency import gather_bounded, cancel_on_disconnect, ClientDisconnected
 from models import get_llm_client
 from memory import LongTermMemory
-from document.vector_store import query_vector_store
+from document.vector_store import query_vector_store, build_vector_store, search_vector_store, vector_db_path, has_vector_store
+from document.chunker import chunk_pages
+from document.doc_store import document_store
+import asyncio
 import uuid
 import logging
 import os
@@ -14,56 +22,175 @@ logging.basicConfig(level=logging.INFO)
 
 router = APIRouter()
 
-# Store the text globally per session (in real apps, use session/context mgmt)
-pdf_text_cache = {}
-
 # Memory to store chat history
 chat_memory = {}
 
 # Initialize long-term memory
 long_term_memory = LongTermMemory()
 
+# Number of chunks retrieved per subtask in /ask-pdf
+RETRIEVAL_TOP_K = int(os.getenv("PDF_RETRIEVAL_TOP_K", "4"))
+
+# Background workers that ingest uploaded PDFs
+ingestion_jobs = JobQueue("pdf_ingestion", workers=int(os.getenv("PDF_INGEST_WORKERS", "2")))
+
+# file hash -> job id of the ingestion running for that content, so concurrent
+# uploads of the same file to this worker share one job instead of ingesting it twice
+_ingesting: dict[str, asyncio.Future] = {}
+
+# Maximum number of subtasks of one /ask-pdf question answered in parallel
+SUBTASK_CONCURRENCY = int(os.getenv("PDF_SUBTASK_CONCURRENCY", "4"))
+
+
+async def index_pdf_pages(pdf_id: str, pages: list, progress=None) -> bool:
+    """
+    Chunk the pages and build the retrieval index used by /ask-pdf. `pages`
+    holds every page of the PDF ("" for empty ones), so chunk page numbers
+    match the document.
+    """
+    try:
+        chunks, metadatas = chunk_pages(pages)
+        await build_vector_store(chunks, vector_db_path(pdf_id), metadatas, progress=progress)
+        logging.info(f"Indexed PDF {pdf_id}: {len(chunks)} chunks")
+        return True
+    except Exception as e:
+        # /ask-pdf falls back to the full document when there is no index
+        logging.error(f"Error indexing PDF {pdf_id}: {str(e)}")
+        return False
+
+
+async def retrieve_context(pdf_id: str, question: str, pages: list) -> str:
+    """Return the most relevant chunks of the PDF for a question."""
+    db_path = vector_db_path(pdf_id)
+    if has_vector_store(db_path):
+        try:
+            docs = await run_in_threadpool(search_vector_store, db_path, question, RETRIEVAL_TOP_K)
+            return "\n\n".join(f"[Page {doc.metadata.get('page', '?')}] {doc.page_content}" for doc in docs)
+        except Exception as e:
+            logging.error(f"Retrieval failed for PDF {pdf_id}, using full text: {str(e)}")
+    return "\n".join(pages)
+
+
+async def ingest_pdf(job, pdf_id: str, file_path: str, filename: str, pages: list = None, file_hash: str = None) -> dict:
+    """Background ingestion: extract, chunk and embed, then summarize."""
+    needs_index = not has_vector_store(vector_db_path(pdf_id))
+    if not pages or needs_index:
+        job.progress("extracting")
+        # Every page, with "" placeholders; the stored text and summary skip the empty ones
+        all_pages = await run_in_threadpool(extract_pages, file_path, file_hash=file_hash)
+        pages = [page for page in all_pages if page.strip()]
+    if not pages:
+        logging.error(f"No text extracted from the uploaded PDF: {filename}")
+        raise ValueError("No extractable text found in the uploaded PDF.")
+
+    logging.info(f"Extracted text from PDF {filename}: {sum(len(page) for page in pages)} characters across {len(pages)} pages")
+
+    await run_in_threadpool(document_store.put, pdf_id, pages)
+    if needs_index:
+        job.progress("indexing")
+        await index_pdf_pages(pdf_id, all_pages, progress=lambda done, total: job.progress("indexing", done, total))
+    full_text = "\\n".join(pages)
+
+    # Use LLM to generate summary points
+    job.progress("summarizing")
+    llm_client = get_llm_client("openai")
+    summary_prompt = (
+        "Read the following document and extract the most important points as concise bullet points. "
+        "Additionally, include related points that are not explicitly mentioned in the document but are relevant to the topic:\n\n"
+        f"{full_text}\n\nBullet Points:"
+    )
+    summary_points = await llm_client.acall(summary_prompt)
+    points = [p.strip("-• \n") for p in summary_points.split("\n") if p.strip()]
+
+    logging.info(f"Generated summary points: {points}")
+    await run_in_threadpool(document_store.set_summary_points, pdf_id, points)
+
+    logging.info(f"PDF processed successfully: {filename}")
+    return {
+        "success": True,
+        "pdf_id": pdf_id,
+        "num_pages": len(pages),
+        "points": points,
+        "fullText": full_text
+    }
+
+
+async def _ingest_once(job, file_hash: str, *args) -> dict:
+    try:
+        return await ingest_pdf(job, *args, file_hash=file_hash)
+    finally:
+        _ingesting.pop(file_hash, None)
+
+
+async def _ingestion_job(file_hash: str, pdf_id: str, file_path: str, filename: str, pages: list) -> tuple[str, bool]:
+    """Job id ingesting this content, and whether it was already running."""
+    running = _ingesting.get(file_hash)
+    if running is not None:
+        return await running, True
+    submitted = _ingesting[file_hash] = asyncio.get_running_loop().create_future()
+    try:
+        job_id = await ingestion_jobs.submit("pdf_ingestion", _ingest_once, file_hash, pdf_id, file_path, filename, pages)
+    except Exception as e:
+        _ingesting.pop(file_hash, None)
+        submitted.set_exception(e)
+        raise
+    submitted.set_result(job_id)
+    return job_id, False
+
 
 @router.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(file: UploadFile = File(...), wait: bool = Form(False)):
+    """
+    Save the PDF and queue its ingestion. Returns the pdf_id and a job_id
+    right away; poll GET /pdf/jobs/{job_id} for progress and results.
+    With wait=true the response is held until ingestion has finished.
+    """
     try:
         pdf_id = uuid.uuid4().hex
-        file_path = save_uploaded_pdf(file, pdf_id)
-        pages = extract_text_from_pdf(file_path)
-        if not pages:
-            logging.error(f"No text extracted from the uploaded PDF: {file.filename}")
-            return {"success": False, "error": "No extractable text found in the uploaded PDF."}
-
-        logging.info(f"Extracted text from PDF {file.filename}: {sum(len(page) for page in pages)} characters across {len(pages)} pages")
-
-        pdf_text_cache[pdf_id] = pages
-        full_text = "\\n".join(pages)
-
-        # Use LLM to generate summary points
-        llm_client = get_llm_client("openai")
-        summary_prompt = (
-            "Read the following document and extract the most important points as concise bullet points. "
-            "Additionally, include related points that are not explicitly mentioned in the document but are relevant to the topic:\n\n"
-            f"{full_text}\n\nBullet Points:"
-        )
-        summary_points = llm_client.call(summary_prompt)
-        points = [p.strip("-• \n") for p in summary_points.split("\n") if p.strip()]
-
-        logging.info(f"Generated summary points: {points}")
-
-        logging.info(f"PDF uploaded successfully: {file.filename}")
-        return {
-            "success": True,
-            "pdf_id": pdf_id,
-            "num_pages": len(pages),
-            "points": points,
-            "fullText": full_text
-        }
+        file_path, file_hash = await run_in_threadpool(save_uploaded_pdf, file, pdf_id)
+        upload = await run_in_threadpool(dedupe_uploaded_pdf, file_path, file_hash, pdf_id)
+        pdf_id, file_path = upload["pdf_id"], upload["file_path"]
+
+        # Same content uploaded before: everything is already computed
+        pages = await run_in_threadpool(document_store.get, pdf_id) if upload["duplicate"] else None
+        if pages and upload["points"] is not None:
+            logging.info(f"Returning cached results for duplicate upload {file.filename} (pdf_id {pdf_id})")
+            return {
+                "success": True,
+                "status": "completed",
+                "pdf_id": pdf_id,
+                "num_pages": len(pages),
+                "points": upload["points"],
+                "fullText": "\\n".join(pages)
+            }
+
+        job_id, attached = await _ingestion_job(file_hash, pdf_id, file_path, file.filename, pages)
+        if attached:
+            logging.info(f"PDF uploaded: {file.filename} (pdf_id {pdf_id}), joined running ingestion job {job_id}")
+        else:
+            logging.info(f"PDF uploaded: {file.filename} (pdf_id {pdf_id}), ingestion job {job_id} queued")
+
+        if wait:
+            job = await ingestion_jobs.wait(job_id)
+            if job["status"] == "completed":
+                return {**job["result"], "status": "completed", "job_id": job_id}
+            return {"success": False, "error": job["error"], "job_id": job_id}
+
+        return {"success": True, "status": "queued", "pdf_id": pdf_id, "job_id": job_id}
     except Exception as e:
         logging.error(f"Error processing PDF upload: {str(e)}")
         return {"success": False, "error": str(e)}
 
 
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress and (once completed) the result of an ingestion job."""
+    job = await ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
 @router.post("/ask-pdf")
 async def ask_pdf(request: Request):
     data = await request.json()
@@ -73,29 +200,38 @@ async def ask_pdf(request: Request):
     if not pdf_id or not question:
         return {"error": "Missing pdf_id or question"}
         
-    pages = pdf_text_cache.get(pdf_id)
+    pages = await run_in_threadpool(document_store.get, pdf_id)
     if not pages:
         return {"error": "PDF not found or expired."}
 
-    full_text = "\n".join(pages)
     subtasks = split_into_subtasks(question)
     
     # Use OpenAI client as default for PDF questions
     llm_client = get_llm_client("openai")
-    responses = []
-    for subtask in subtasks:
-        # Create a comprehensive prompt with PDF context
+
+    async def answer_subtask(subtask: str) -> str:
+        # Only the chunks relevant to this subtask are sent to the LLM
+        context = await retrieve_context(pdf_id, subtask, pages)
         prompt_with_context = f"""
 Based on the following PDF content, please answer the question: {subtask}
 
 PDF Content:
-{full_text}
+{context}
 
 Question: {subtask}
 """
-        response = llm_client.call(prompt_with_context)
-        responses.append(response)
-    
+        return await llm_client.acall(prompt_with_context)
+
+    # Subtasks run concurrently; answers keep the order of the question
+    try:
+        responses = await cancel_on_disconnect(
+            request,
+            gather_bounded((answer_subtask(subtask) for subtask in subtasks), SUBTASK_CONCURRENCY)
+        )
+    except ClientDisconnected:
+        logging.info(f"Client disconnected, cancelled /ask-pdf for PDF {pdf_id}")
+        return Response(status_code=499)
+
     answer = "\n".join(responses)
     return {"answer": answer}
 
@@ -134,7 +270,14 @@ Question: {question}
 
     # Use OpenAI client as default for PDF questions
     llm_client = get_llm_client("openai")
-    response = llm_client.call(prompt_with_context)
+
+    if wants_stream(data, request.headers):
+        return sse_response(
+            llm_client.astream(prompt_with_context),
+            on_complete=lambda answer: long_term_memory.add_interaction(user_id, question, answer)
+        )
+
+    response = await llm_client.acall(prompt_with_context)
 
     # Update long-term memory
     long_term_memory.add_interaction(user_id, question, response)
@@ -145,12 +288,12 @@ Question: {question}
 @router.get("/summary")
 async def get_pdf_summary():
     """Get summary of the most recently uploaded PDF"""
-    if not pdf_text_cache:
+    # Get the most recent PDF
+    latest_pdf_id = await run_in_threadpool(document_store.latest_id)
+    if not latest_pdf_id:
         return {"error": "No PDF uploaded"}
     
-    # Get the most recent PDF
-    latest_pdf_id = list(pdf_text_cache.keys())[-1]
-    pages = pdf_text_cache[latest_pdf_id]
+    pages = await run_in_threadpool(document_store.get, latest_pdf_id)
     full_text = "\n".join(pages)
     
     # Use OpenAI client to generate summary
@@ -162,7 +305,7 @@ Please provide a concise summary of the following document:
 
 Summary:
 """
-    summary = llm_client.call(summary_prompt)
+    summary = await llm_client.acall(summary_prompt)
     return {"summary": summary}
 
 
@@ -189,9 +332,10 @@ async def get_recommendations(request: Request):
             # Get PDF content if a PDF ID is provided
             pdf_content = ""
             pdf_id = data.get("pdf_id", "")
-            if pdf_id and pdf_id in pdf_text_cache:
+            pdf_pages = await run_in_threadpool(document_store.get, pdf_id) if pdf_id else None
+            if pdf_pages:
                 # Get first 1000 chars of the PDF for context
-                pdf_content = "\n".join(pdf_text_cache[pdf_id])[:1500]
+                pdf_content = "\n".join(pdf_pages)[:1500]
                 print(f"Including PDF content for context with ID: {pdf_id}")
             
             # Create an enhanced prompt for generating recommendations            # Add randomness to the prompt if a seed is provided
@@ -225,7 +369,7 @@ Requirements:
 Generate exactly 5 recommendations, one per line, without numbering or bullet points:
 """
             
-            recommendations_text = llm_client.call(recommendation_prompt)
+            recommendations_text = await llm_client.acall(recommendation_prompt)
             
             # Parse the LLM response into a list
             recommendations = []
@@ -253,9 +397,10 @@ Generate exactly 5 recommendations, one per line, without numbering or bullet po
             print(f"LLM recommendation generation error: {e}")
               # Get PDF content if available
             pdf_id = data.get("pdf_id", "")
-            if pdf_id and pdf_id in pdf_text_cache:
+            pdf_pages = await run_in_threadpool(document_store.get, pdf_id) if pdf_id else None
+            if pdf_pages:
                 # Get a small sample of phrases from the PDF to make contextual suggestions
-                pdf_text = "\n".join(pdf_text_cache[pdf_id])
+                pdf_text = "\n".join(pdf_pages)
                 # Extract some keywords for better suggestions
                 important_phrases = []
                 
@@ -311,11 +456,9 @@ Generate exactly 5 recommendations, one per line, without numbering or bullet po
         ]}
 
 
-@router.get("/get-pdf/{pdf_id}")
-async def get_pdf_file(pdf_id: str):
+@router.api_route("/get-pdf/{pdf_id}", methods=["GET", "HEAD"])
+async def get_pdf_file(pdf_id: str, request: Request):
     try:
-        # Enhanced request logging with clear demarcation
-        logging.info(f"========== PDF REQUEST STARTED ==========")
         logging.info(f"PDF file requested with ID: {pdf_id}")
         
         # Input validation
@@ -323,101 +466,34 @@ async def get_pdf_file(pdf_id: str):
             logging.error(f"Invalid PDF ID format: {pdf_id}")
             raise HTTPException(status_code=400, detail=f"Invalid PDF ID format: {pdf_id}")
         
-        # Debug check for pdf_text_cache
-        if pdf_text_cache:
-            if pdf_id not in pdf_text_cache:
-                logging.warning(f"PDF ID {pdf_id} not found in pdf_text_cache")
-                # List available IDs for debugging (but limit the output)
-                cache_ids = list(pdf_text_cache.keys())[:5]
-                cache_count = len(pdf_text_cache)
-                logging.info(f"First 5 available PDF IDs in cache (total: {cache_count}): {cache_ids}")
-                logging.info(f"Attempting to find file even though ID is not in cache...")
-            else:
-                logging.info(f"PDF ID {pdf_id} found in pdf_text_cache")
-        else:
-            logging.warning("pdf_text_cache is empty or not initialized")
-
-        # Search for the file in the temp_pdfs directory
-        temp_dir = "temp_pdfs"
-        
-        # Make sure the directory exists
-        if not os.path.isdir(temp_dir):
-            os.makedirs(temp_dir, exist_ok=True)
-            logging.info(f"Created missing temp_pdfs directory")
-            
-        files = os.listdir(temp_dir)
-        logging.info(f"Found {len(files)} files in {temp_dir} directory")
-        
-        # Find the file with more robust matching approaches
-        pdf_file_path = None
-        exact_matches = []
-        prefix_matches = []
-        substring_matches = []
-        
-        for file in files:
-            # Track different matching strategies for logging
-            if file.startswith(f"{pdf_id}_"):
-                prefix_matches.append(file)
-            elif pdf_id in file:
-                substring_matches.append(file)
-                
-        # Log match attempts
-        logging.info(f"Match results for ID {pdf_id}:")
-        logging.info(f"  Prefix matches: {len(prefix_matches)}")
-        logging.info(f"  Substring matches: {len(substring_matches)}")
-        
-        # Choose the best match (prefer prefix matches)
-        if prefix_matches:
-            pdf_file_path = os.path.join(temp_dir, prefix_matches[0])
-            logging.info(f"Using prefix match: {prefix_matches[0]}")
-        elif substring_matches:
-            pdf_file_path = os.path.join(temp_dir, substring_matches[0])
-            logging.info(f"Using substring match: {substring_matches[0]}")
-        
+        # Indexed pdf_id -> path lookup instead of scanning temp_pdfs
+        pdf_file_path = await run_in_threadpool(find_pdf_path, pdf_id)
         if not pdf_file_path:
-            # Better error messaging with helpful debugging info
-            logging.error(f"PDF file with ID {pdf_id} not found in {temp_dir}")
-            sample_files = [f for f in files[:5] if f.endswith('.pdf')]
+            logging.error(f"PDF file with ID {pdf_id} not found")
             error_detail = {
                 "error": f"PDF file with ID {pdf_id} not found",
-                "directory": temp_dir,
-                "file_count": len(files),
-                "sample_files": sample_files,
                 "tip": "Check if the file was uploaded correctly and the ID is correct."
             }
             raise HTTPException(status_code=404, detail=error_detail)
         
-        # Verify file exists and is readable
-        if not os.path.exists(pdf_file_path):
-            logging.error(f"File path exists in matching logic but file not found: {pdf_file_path}")
-            raise HTTPException(status_code=404, detail=f"PDF file exists in index but not on disk: {pdf_file_path}")
-        
-        # Add logging to help with debugging
-        file_size = os.path.getsize(pdf_file_path)
-        logging.info(f"Serving PDF file: {pdf_file_path} ({file_size} bytes)")
-        logging.info(f"========== PDF REQUEST COMPLETED ==========")
-        
-        # Create a response with the PDF file and add CORS headers
-        response = FileResponse(
-            path=pdf_file_path, 
+        # Supports If-None-Match/If-Modified-Since (304) and Range (206) requests
+        return file_response(
+            request,
+            pdf_file_path,
             media_type="application/pdf",
             headers={
                 # Use inline instead of attachment to view in browser
                 "Content-Disposition": f"inline; filename={os.path.basename(pdf_file_path)}",
                 "Access-Control-Allow-Origin": "*",
                 "Access-Control-Allow-Methods": "GET, OPTIONS, HEAD",
-                "Access-Control-Allow-Headers": "Content-Type, Content-Disposition, Content-Length",
-                "Access-Control-Expose-Headers": "Content-Disposition, Content-Length, Content-Type"
+                "Access-Control-Allow-Headers": "Content-Type, Content-Disposition, Content-Length, Range, If-None-Match, If-Modified-Since",
+                "Access-Control-Expose-Headers": "Content-Disposition, Content-Length, Content-Type, Content-Range, Accept-Ranges, ETag, Last-Modified"
             }
         )
-        
-        return response
     except HTTPException:
         # Re-raise HTTP exceptions (404, etc.) without wrapping them
-        logging.error(f"========== PDF REQUEST FAILED WITH HTTP ERROR ==========")
         raise
     except Exception as e:
         # Catch other exceptions and wrap them in a 500 error
         logging.error(f"Error in get_pdf_file: {str(e)}")
-        logging.error(f"========== PDF REQUEST FAILED WITH SERVER ERROR ==========")
         raise HTTPException(status_code=500, detail=f"Error retrieving PDF: {str(e)}")
@@ -4,6 +4,7 @@ from llm_clients.ollama_client import OllamaClient
 from llm_clients.llama_client import LLaMaClient
 from llm_clients.gemma_client import GemmaClient
 from utils.context_injector import inject_context
+from utils.streaming import wants_stream, sse_response
 
 MODEL_CLIENTS = {
     "openai": OpenAIClient(),
@@ -25,4 +26,7 @@ async def route_prompt(data):
     if not client:
         return {"error": f"Model '{model}' not supported"}
 
-    return {"response": client.call(full_prompt)}
+    if wants_stream(data):
+        return sse_response(client.astream(full_prompt))
+
+    return {"response": await client.acall(full_prompt)}
@@ -1,8 +1,12 @@
 from fastapi import APIRouter, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import requests
-from document.vector_store import query_vector_store
+from document.vector_store import cached_query_vector_store
+from document.query_cache import cache_stats
+from document.collection_store import collection_exists, collection_path
 from models import get_llm_client
+from utils.streaming import sse_response
 
 router = APIRouter()
 
@@ -22,18 +26,36 @@ async def google_search(query: str):
         raise HTTPException(status_code=500, detail=f"Google Search failed: {str(e)}")
 
 @router.post("/rag-search")
-async def rag_search(query: str):
-    try:
+async def rag_search(query: str, collection: str = None, doc_ids: str = None):
+    # doc_ids: comma-separated document ids to restrict a collection search to
+    if collection:
+        try:
+            db_path = collection_path(collection)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not collection_exists(collection):
+            raise HTTPException(status_code=404, detail=f"Collection '{collection}' not found")
+        cache_id = f"collection:{collection}"
+    else:
         # Assuming a pre-built FAISS vector store exists
         db_path = "vector_dbs/default.faiss"
-        result = query_vector_store(db_path, query)
+        cache_id = "default"
+    filter_ids = [doc_id.strip() for doc_id in doc_ids.split(",") if doc_id.strip()] if doc_ids else None
+    try:
+        result = await run_in_threadpool(cached_query_vector_store, cache_id, db_path, query, filter_ids)
         return [result]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"RAG Search failed: {str(e)}")
 
+@router.get("/cache-stats")
+async def get_cache_stats():
+    """Hit rates of the query-embedding and answer caches."""
+    return cache_stats()
+
 class ChatbotRequest(BaseModel):
     query: str
     conversation: list[dict]  # Expect a list of messages with role and content
+    stream: bool = False  # Send tokens as Server-Sent Events as they arrive
 
 @router.post("/chatbot")
 async def chatbot(request: ChatbotRequest):
@@ -47,7 +69,11 @@ async def chatbot(request: ChatbotRequest):
             [f"{msg['role'].capitalize()}: {msg['content']}" for msg in request.conversation]
         )
         full_prompt = f"{conversation_context}\nUser: {request.query}\nChatbot:"
-        response = llm_client.call(full_prompt)
+
+        if request.stream:
+            return sse_response(llm_client.astream(full_prompt))
+
+        response = await llm_client.acall(full_prompt)
 
         print(f"Chatbot response: {response}")
         return {"response": response}
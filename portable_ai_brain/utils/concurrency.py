@@ -0,0 +1,40 @@
+import asyncio
+from typing import Awaitable, Iterable
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client went away before the work finished."""
+
+
+async def gather_bounded(coros: Iterable[Awaitable], limit: int) -> list:
+    """
+    Run the awaitables concurrently with at most `limit` in flight.
+    Results come back in the same order as the input.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coros))
+
+
+async def cancel_on_disconnect(request, coro: Awaitable, poll_interval: float = 0.5):
+    """
+    Await `coro`, cancelling it if the client disconnects in the meantime.
+    Raises ClientDisconnected in that case.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnected()
+    finally:
+        # Also covers the handler itself being cancelled
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,98 @@
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from utils.uploads import UPLOAD_CHUNK_SIZE
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _etag(stat) -> str:
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _byte_range(range_header: str, size: int):
+    """(start, end) inclusive for a single-range header, or None if unsatisfiable."""
+    match = RANGE_PATTERN.match(range_header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+def _iter_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: str, media_type: str, headers: dict = None) -> Response:
+    """
+    Serve a file with ETag/Last-Modified validators and single-range support,
+    so clients can revalidate (304) or fetch parts of it (206).
+    """
+    stat = os.stat(path)
+    etag = _etag(stat)
+    base_headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=base_headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A stale If-Range means the client's partial copy is outdated: send the whole file
+    # Unknown range units are ignored and the whole file is sent
+    if range_header and range_header.strip().startswith("bytes=") and (not if_range or if_range == etag or if_range == base_headers["Last-Modified"]):
+        byte_range = _byte_range(range_header, stat.st_size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**base_headers, "Content-Range": f"bytes */{stat.st_size}"})
+        start, end = byte_range
+        return StreamingResponse(
+            _iter_range(path, start, end),
+            status_code=206,
+            media_type=media_type,
+            headers={
+                **base_headers,
+                "Content-Range": f"bytes {start}-{end}/{stat.st_size}",
+                "Content-Length": str(end - start + 1),
+            }
+        )
+
+    return FileResponse(path=path, media_type=media_type, headers=base_headers, stat_result=stat)
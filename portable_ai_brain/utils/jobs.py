@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable
+from utils.sqlite_store import connect
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+
+
+class Job:
+    """Handle passed to a job function so it can report progress."""
+
+    def __init__(self, queue: "JobQueue", job_id: str):
+        self.queue = queue
+        self.id = job_id
+
+    def progress(self, stage: str, done: int = 0, total: int = 0) -> None:
+        # Written in the background: job functions report progress from the event loop
+        self.queue._writer.submit(self.queue._update, self.id, progress={"stage": stage, "done": done, "total": total})
+
+
+class JobQueue:
+    """
+    In-process background job queue with a fixed pool of asyncio workers.
+
+    Job state lives in SQLite, so GET /jobs/{id} answers from any worker
+    process, not just the one running the job. SQLite calls run off the
+    event loop; writes go through one thread so they land in order. Queues
+    share the table; each only sees the jobs submitted under its own name.
+    """
+
+    def __init__(self, name: str, workers: int = 2, db_path: str = JOB_STORE_PATH):
+        self.name = name
+        self.workers = workers
+        self.db_path = db_path
+        self._queue = None
+        self._tasks = []
+        self._done_events: dict[str, asyncio.Event] = {}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-writer")
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, "
+                "progress TEXT, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if "queue" not in columns:
+                # Tables created before queues were told apart
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN queue TEXT")
+                except sqlite3.OperationalError:
+                    pass  # another worker process added it first
+
+    def _start(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    def _update(self, job_id: str, **fields) -> None:
+        columns = {"updated_at": time.time()}
+        for name, value in fields.items():
+            columns[name] = json.dumps(value) if name in ("progress", "result") else value
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        with connect(self.db_path) as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*columns.values(), job_id))
+
+    async def _write(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, lambda: func(*args, **kwargs))
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, func, args = await self._queue.get()
+            try:
+                await self._write(self._update, job_id, status="running")
+                result = await func(Job(self, job_id), *args)
+                await self._write(self._update, job_id, status="completed", result=result)
+            except asyncio.CancelledError:
+                # Not awaited: this task is being cancelled
+                self._writer.submit(self._update, job_id, status="failed", error="Cancelled")
+                raise
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {str(e)}")
+                await self._write(self._update, job_id, status="failed", error=str(e))
+            finally:
+                event = self._done_events.pop(job_id, None)
+                if event:
+                    event.set()
+                self._queue.task_done()
+
+    def _insert(self, job_id: str, kind: str) -> None:
+        now = time.time()
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, queue, kind, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, self.name, kind, now, now)
+            )
+
+    async def submit(self, kind: str, func: Callable[..., Awaitable[dict]], *args) -> str:
+        """Queue `func(job, *args)` and return the new job id immediately."""
+        self._start()
+        job_id = uuid.uuid4().hex
+        await self._write(self._insert, job_id, kind)
+        self._done_events[job_id] = asyncio.Event()
+        self._queue.put_nowait((job_id, func, args))
+        return job_id
+
+    async def wait(self, job_id: str) -> dict | None:
+        """Wait for a job submitted by this process to finish and return it."""
+        event = self._done_events.get(job_id)
+        if event:
+            await event.wait()
+        return await self.get(job_id)
+
+    async def get(self, job_id: str) -> dict | None:
+        """A job of this queue, or None (also for job ids of other queues)."""
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> dict | None:
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT job_id, kind, status, progress, result, error, created_at, updated_at FROM jobs "
+                "WHERE job_id = ? AND queue = ?",
+                (job_id, self.name)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "progress": json.loads(row[3]) if row[3] else None,
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "updated_at": row[7]
+        }
+
+    async def shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self._writer.shutdown)
@@ -0,0 +1,21 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(db_path: str):
+    """
+    Open a short-lived SQLite connection, committing on success.
+    WAL mode lets every uvicorn worker read while another one writes.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
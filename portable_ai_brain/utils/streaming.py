@@ -0,0 +1,56 @@
+import json
+import logging
+from typing import AsyncIterator, Callable, Optional
+from fastapi.responses import StreamingResponse
+
+
+def wants_stream(data: dict, headers=None) -> bool:
+    """A client opts into streaming with `"stream": true` in the body or an
+    `Accept: text/event-stream` header. Everyone else keeps the JSON reply."""
+    if data.get("stream"):
+        return True
+    if headers is not None:
+        return "text/event-stream" in headers.get("accept", "")
+    return False
+
+
+def _sse_event(payload: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+
+def sse_response(tokens: AsyncIterator[str], on_complete: Optional[Callable[[str], None]] = None) -> StreamingResponse:
+    """
+    Forward tokens to the client as Server-Sent Events.
+
+    Each token is sent as `data: {"token": ...}`; the stream ends with an
+    `event: done` carrying the full answer. `on_complete` receives the full
+    answer once the model has finished (e.g. to update chat memory). If the
+    model fails mid-stream, an `event: error` is sent instead of `done` and
+    `on_complete` is not called, so partial answers are never saved.
+    """
+    async def event_stream():
+        parts = []
+        try:
+            async for token in tokens:
+                parts.append(token)
+                yield _sse_event({"token": token})
+        except Exception as e:
+            logging.error(f"Error while streaming response: {str(e)}")
+            yield _sse_event({"error": str(e)}, event="error")
+            return
+
+        answer = "".join(parts)
+        if on_complete:
+            on_complete(answer)
+        yield _sse_event({"answer": answer}, event="done")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop reverse proxies (nginx) from buffering the whole stream
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,24 @@
+import asyncio
+from typing import AsyncIterator
+
+# Uploads are moved around in chunks of this size so memory stays flat
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def iter_upload(file, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield an UploadFile's content chunk by chunk."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def iter_file(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Yield a file on disk chunk by chunk, reading off the event loop."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,109 @@
+import importlib.util
+import os
+import re
+import tempfile
+
+# "torch" (full precision), "int8" (dynamic quantization) or "onnx" (ONNX Runtime image encoder)
+VISION_BACKEND = os.getenv("VISION_BACKEND", "torch")
+# 0 leaves the library defaults alone
+VISION_NUM_THREADS = int(os.getenv("VISION_NUM_THREADS", "0"))
+VISION_ONNX_DIR = os.getenv("VISION_ONNX_DIR", "vision_onnx")
+
+BACKENDS = ("torch", "int8", "onnx")
+
+
+def resolve_backend(backend: str = VISION_BACKEND) -> str:
+    """
+    The backend that will actually be loaded: "onnx" falls back to "int8"
+    when onnxruntime is not installed. Decided before the model loads, so
+    caption cache entries are keyed by the backend that produced them.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown VISION_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+        print("onnxruntime is not installed; using the int8 vision backend instead")
+        return "int8"
+    return backend
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the Linear layers (weights int8, activations quantized per batch)."""
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _export_vision_encoder(model, onnx_path: str) -> None:
+    import torch
+
+    class Encoder(torch.nn.Module):
+        def __init__(self, vision_model):
+            super().__init__()
+            self.vision_model = vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values)[0]
+
+    size = model.config.vision_config.image_size
+    directory = os.path.dirname(onnx_path)
+    os.makedirs(directory, exist_ok=True)
+    # A private temp file per exporter: workers starting together each write their own
+    fd, tmp_path = tempfile.mkstemp(suffix=".onnx.tmp", dir=directory)
+    os.close(fd)
+    try:
+        torch.onnx.export(
+            Encoder(model.vision_model).eval(),
+            (torch.zeros(1, 3, size, size),),
+            tmp_path,
+            input_names=["pixel_values"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "last_hidden_state": {0: "batch"}},
+            opset_version=17
+        )
+        os.replace(tmp_path, onnx_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def use_onnx_encoder(model, model_name: str, num_threads: int = VISION_NUM_THREADS):
+    """
+    Run BLIP's image encoder (most of the per-image compute) in ONNX Runtime.
+    The encoder is exported once to VISION_ONNX_DIR; the text decoder stays
+    in PyTorch and is int8-quantized.
+    """
+    import onnxruntime as ort
+    import torch
+
+    onnx_path = os.path.join(VISION_ONNX_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name) + ".onnx")
+    if not os.path.exists(onnx_path):
+        _export_vision_encoder(model, onnx_path)
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+    class OnnxVisionModel(torch.nn.Module):
+        # Stands in for model.vision_model; generate() only reads output[0]
+        def forward(self, pixel_values=None, **kwargs):
+            hidden = session.run(None, {"pixel_values": pixel_values.numpy().astype("float32")})[0]
+            return (torch.from_numpy(hidden),)
+
+    model.vision_model = OnnxVisionModel()
+    model.text_decoder = quantize_int8(model.text_decoder)
+    return model
+
+
+def prepare_model(model, backend: str = VISION_BACKEND, model_name: str = "", num_threads: int = VISION_NUM_THREADS):
+    """Apply a CPU inference backend (see resolve_backend()) to a loaded BLIP model."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown VISION_BACKEND {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+    if backend == "int8":
+        return quantize_int8(model)
+    if backend == "onnx":
+        return use_onnx_encoder(model, model_name, num_threads)
+    return model
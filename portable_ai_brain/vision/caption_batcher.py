@@ -0,0 +1,77 @@
+import asyncio
+import os
+
+VISION_MAX_BATCH = int(os.getenv("VISION_MAX_BATCH", "8"))
+VISION_BATCH_WINDOW_MS = float(os.getenv("VISION_BATCH_WINDOW_MS", "25"))
+
+
+class CaptionBatcher:
+    """
+    Single inference worker in front of a VisionClient. Images submitted
+    within VISION_BATCH_WINDOW_MS of each other (up to VISION_MAX_BATCH) are
+    captioned in one batched model call; only one batch runs at a time.
+    """
+
+    def __init__(self, client, max_batch: int = VISION_MAX_BATCH, window_ms: float = VISION_BATCH_WINDOW_MS):
+        self.client = client
+        self.max_batch = max(1, max_batch)
+        self.window = window_ms / 1000
+        self._queue = None
+        self._worker = None
+
+    def _ensure_worker(self):
+        # Created on first use so both belong to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            # Requests cancelled while waiting (e.g. client disconnects) are dropped
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                captions = await asyncio.to_thread(self.client.caption_images, [image for image, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), caption in zip(batch, captions):
+                if not future.done():
+                    future.set_result(caption)
+
+    async def caption(self, image) -> str:
+        """Caption one RGB PIL image, batched with any concurrent requests."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def caption_many(self, images: list) -> list[str]:
+        return list(await asyncio.gather(*(self.caption(image) for image in images)))
+
+    async def shutdown(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from PIL import Image
+from utils.sqlite_store import connect
+
+CAPTION_CACHE_PATH = os.getenv("CAPTION_CACHE_PATH", "caption_cache.sqlite3")
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", "10000"))
+# Images whose 64-bit dHashes differ in at most this many bits count as the same picture
+CAPTION_HASH_MAX_DISTANCE = int(os.getenv("CAPTION_HASH_MAX_DISTANCE", "4"))
+
+# The dHash is split into 8-bit bands; by pigeonhole, hashes within 7 bits share a band
+_BANDS = 8
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: survives re-encoding, resizing and small edits."""
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] < pixels[row * 9 + col + 1])
+    return value
+
+
+def _bands(value: int):
+    return [(band, (value >> (8 * band)) & 0xFF) for band in range(_BANDS)]
+
+
+class CaptionCache:
+    """
+    Captions by exact content hash and by perceptual hash, for one model
+    configuration. Recent entries are kept in memory; all of them on disk.
+    """
+
+    def __init__(self, model_key: str, db_path: str = CAPTION_CACHE_PATH, max_entries: int = CAPTION_CACHE_SIZE,
+                 max_distance: int = CAPTION_HASH_MAX_DISTANCE):
+        self.model_key = model_key
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_distance = min(max_distance, _BANDS - 1)
+        self._by_sha: OrderedDict = OrderedDict()
+        self._by_dhash: OrderedDict = OrderedDict()
+        # (band, band value) -> dHashes of every cached image, loaded from disk on first use
+        self._band_index: dict = {}
+        self._band_index_loaded = False
+        self._lock = threading.Lock()
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                "model TEXT NOT NULL, sha256 TEXT NOT NULL, dhash TEXT NOT NULL, caption TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (model, sha256))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_captions_dhash ON captions (model, dhash)")
+
+    def _remember(self, sha: str, value: int, caption: str) -> None:
+        for entries, key in ((self._by_sha, sha), (self._by_dhash, value)):
+            entries[key] = caption
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def _index(self, value: int) -> None:
+        for band in _bands(value):
+            self._band_index.setdefault(band, set()).add(value)
+
+    def _load_band_index(self) -> None:
+        with connect(self.db_path) as conn:
+            rows = conn.execute("SELECT DISTINCT dhash FROM captions WHERE model = ?", (self.model_key,)).fetchall()
+        for (value,) in rows:
+            self._index(int(value, 16))
+        self._band_index_loaded = True
+
+    def get_exact(self, sha: str):
+        with self._lock:
+            caption = self._by_sha.get(sha)
+            if caption is not None:
+                self._by_sha.move_to_end(sha)
+                return caption
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT dhash, caption FROM captions WHERE model = ? AND sha256 = ?", (self.model_key, sha)
+            ).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self._remember(sha, int(row[0], 16), row[1])
+        return row[1]
+
+    def get_similar(self, value: int):
+        """Caption of the closest cached image within max_distance bits, if any."""
+        with self._lock:
+            if not self._band_index_loaded:
+                self._load_band_index()
+            candidates = set()
+            for band in _bands(value):
+                candidates |= self._band_index.get(band, set())
+            best = min(candidates, key=lambda other: bin(value ^ other).count("1"), default=None)
+            if best is None or bin(value ^ best).count("1") > self.max_distance:
+                return None
+            caption = self._by_dhash.get(best)
+            if caption is not None:
+                self._by_dhash.move_to_end(best)
+                return caption
+        with connect(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT caption FROM captions WHERE model = ? AND dhash = ? LIMIT 1", (self.model_key, f"{best:016x}")
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, sha: str, value: int, caption: str) -> None:
+        with connect(self.db_path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO captions (model, sha256, dhash, caption, created_at) VALUES (?, ?, ?, ?, ?)",
+                (self.model_key, sha, f"{value:016x}", caption, time.time())
+            )
+        with self._lock:
+            self._remember(sha, value, caption)
+            if self._band_index_loaded:
+                self._index(value)
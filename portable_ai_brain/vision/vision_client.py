@@ -1,19 +1,45 @@
 # vision/vision_client.py
-from transformers import BlipProcessor, BlipForConditionalGeneration
+import os
+import threading
 from PIL import Image
-import torch
+from vision.backends import VISION_BACKEND, VISION_NUM_THREADS, prepare_model, resolve_backend
+
+VISION_MODEL_NAME = os.getenv("VISION_MODEL_NAME", "Salesforce/blip-image-captioning-base")
 
 class VisionClient:
-    def __init__(self):
-        self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+    """BLIP captioning; the model is loaded on first use, not at import."""
 
-    def analyze_image(self, image_path: str) -> str:
-        image = Image.open(image_path).convert("RGB")
-        inputs = self.processor(images=image, return_tensors="pt")
+    def __init__(self, model_name: str = VISION_MODEL_NAME, backend: str = VISION_BACKEND,
+                 num_threads: int = VISION_NUM_THREADS):
+        self.model_name = model_name
+        # The backend actually loaded, which the caption cache is keyed by
+        self.backend = resolve_backend(backend)
+        self.num_threads = num_threads
+        self.processor = None
+        self.model = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self.model is None:
+                from transformers import BlipProcessor, BlipForConditionalGeneration
+                self.processor = BlipProcessor.from_pretrained(self.model_name)
+                model = BlipForConditionalGeneration.from_pretrained(self.model_name)
+                model.eval()
+                self.model = prepare_model(model, self.backend, self.model_name, self.num_threads)
+
+    def caption_images(self, images: list) -> list[str]:
+        """Caption a batch of RGB PIL images in one generate() call."""
+        import torch
+        if self.model is None:
+            self._load()
+        inputs = self.processor(images=images, return_tensors="pt")
 
         with torch.no_grad():
             output = self.model.generate(**inputs)
-        
-        caption = self.processor.decode(output[0], skip_special_tokens=True)
-        return caption
+
+        return self.processor.batch_decode(output, skip_special_tokens=True)
+
+    def analyze_image(self, image_path: str) -> str:
+        image = Image.open(image_path).convert("RGB")
+        return self.caption_images([image])[0]
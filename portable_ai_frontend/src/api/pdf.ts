@@ -6,6 +6,8 @@ export const uploadPDF = async (file: File) => {
   try {
     const formData = new FormData();
     formData.append("file", file);
+    // Ingestion runs as a background job; wait for it so points/fullText are returned
+    formData.append("wait", "true");
     
     console.log("Uploading PDF:", file.name, "size:", file.size, "bytes");
     
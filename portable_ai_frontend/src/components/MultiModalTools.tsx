@@ -38,6 +38,7 @@ const MultiModalTools = ({ onVisionCaption, onVideoExtract }: Props) => {
 
     const formData = new FormData();
     formData.append("video_url", videoUrl);
+    formData.append("wait", "true");
 
     try {
       const res = await fetch("http://localhost:8000/multimodal/extract-from-video", {